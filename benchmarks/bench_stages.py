@@ -0,0 +1,337 @@
+from contextlib import redirect_stdout
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from serenity import inputs
+from serenity.synthetic import write_recon
+from serenity.pipeline import TARGET_STRING, classify_vcenter, run_scans
+from serenity.process_scans.pre_process import (
+    read_raw_input,
+    normalize_data,
+    drop_empty_rows_columns,
+    process_scans,
+)
+from serenity.process_scans.v_center import (
+    trim_cm_dns_name,
+    add_considered_comment,
+    split_rh_nonrh,
+    ignore_template_and_discovery,
+    check_duplicates,
+)
+from serenity.process_scans.network import (
+    prep_network_data,
+    find_error_lines,
+    check_for_errors,
+    new_host_names,
+    add_date_column,
+)
+from serenity.process_scans.satellite import process_satellite
+from serenity.process_scans.hostname_index import build_hostname_index
+from serenity.process_scans.intermediate import read_intermediate
+from serenity.process_scans.identity import IDENTITY_KEYS, identity_keys
+from serenity.process_scans.create_deployment_details import (
+    source_columns,
+    deployment_from_scan,
+    combine_deployments,
+)
+
+# Number of hosts of every scan of the synthetic recons
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+# Columns compared in validation mode for each scan, see inputs
+VALIDATED_SCANS = {
+    "vcenter": (
+        inputs.gbd_keys_vcenter,
+        inputs.auto_keys_vcenter,
+        inputs.gbd_cols_vcenter,
+        inputs.auto_cols_vcenter,
+    ),
+    "network": (
+        inputs.gbd_keys_network,
+        inputs.auto_keys_network,
+        inputs.gbd_cols_network,
+        inputs.auto_cols_network,
+    ),
+}
+
+
+def fresh_arguments(args):
+    """
+    Copies the dataframe arguments of a stage, since most stages update their input in place
+
+    Parameters:
+    - args (tuple): Arguments of the stage
+
+    Returns:
+    - (list): Arguments with every dataframe copied
+    """
+
+    return [arg.copy() if isinstance(arg, pd.DataFrame) else arg for arg in args]
+
+
+def measure(stage, args, repeat):
+    """
+    Times a stage and measures its peak memory. The dataframe arguments are copied before every call, outside the
+    measurements, and the peak memory is measured on a separate call since tracemalloc slows the stage down.
+
+    Parameters:
+    - stage (function): Stage function
+    - args (tuple): Arguments of the stage
+    - repeat (int): Number of timed calls
+
+    Returns:
+    - (dict): Best wall time in seconds and peak allocated memory in MiB
+    """
+
+    timings = []
+    for _ in range(repeat):
+        stage_args = fresh_arguments(args)
+        start = time.perf_counter()
+        stage(*stage_args)
+        timings.append(time.perf_counter() - start)
+
+    stage_args = fresh_arguments(args)
+    tracemalloc.start()
+    stage(*stage_args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": min(timings), "peak_mib": peak / 2**20}
+
+
+def write_gbd_reference(datadir: Path, scan_type):
+    """
+    Writes the automated intermediate data of a scan as its GBD generated data, so validation runs on every row
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    """
+
+    gbd_keys, auto_keys, gbd_cols, auto_cols = VALIDATED_SCANS[scan_type]
+    auto_df = read_intermediate(
+        datadir, scan_type, auto_keys + auto_cols, rendered=True
+    )
+    gbd_df = auto_df.rename(
+        columns=dict(zip(auto_keys + auto_cols, gbd_keys + gbd_cols))
+    )
+    gbd_df.to_csv(
+        datadir
+        / "intermediate"
+        / scan_type
+        / f"{scan_type}_intermediate_gbd_generated.csv",
+        index=False,
+    )
+
+
+def stage_cases(datadir: Path):
+    """
+    Prepares the inputs of every benchmarked stage from a synthetic recon, in pipeline order
+
+    Parameters:
+    - datadir (Path): Folder location of the synthetic recon
+
+    Returns:
+    - generator: Name, function and arguments of each stage, see measure
+    """
+
+    raw = datadir / "raw"
+
+    # vCenter
+    yield "read_raw_input[vcenter]", read_raw_input, (raw / "vcenter",)
+    v_details, v_deployments = read_raw_input(raw / "vcenter")
+    yield "normalize_data[vcenter]", normalize_data, (
+        v_details,
+        v_deployments,
+        inputs.fact_keys_vcenter,
+    )
+    v_center = drop_empty_rows_columns(
+        normalize_data(v_details, v_deployments, inputs.fact_keys_vcenter)[0], "rows"
+    )
+    red_hat_servers = split_rh_nonrh(
+        add_considered_comment(trim_cm_dns_name(v_center.copy()))
+    )[0]
+    red_hat_servers = ignore_template_and_discovery(red_hat_servers)
+    yield "check_duplicates", check_duplicates, (red_hat_servers,)
+    vcenter_index = build_hostname_index(classify_vcenter(v_center.copy()))
+
+    # Network
+    n_details, n_deployments = read_raw_input(raw / "network")
+    yield "prep_network_data", prep_network_data, (
+        n_details,
+        n_deployments,
+        inputs.fact_keys_network,
+        TARGET_STRING,
+    )
+    network_details, network_deployment = prep_network_data(
+        n_details, n_deployments, inputs.fact_keys_network, TARGET_STRING
+    )
+    network_details = drop_empty_rows_columns(network_details, "rows")
+    yield "find_error_lines", find_error_lines, (network_details, TARGET_STRING)
+    error_lines = find_error_lines(network_details, TARGET_STRING)
+    yield "check_for_errors", check_for_errors, (
+        network_details,
+        TARGET_STRING,
+        error_lines,
+    )
+    network_details = check_for_errors(network_details, TARGET_STRING, error_lines)
+    yield "new_host_names", new_host_names, (
+        network_details,
+        vcenter_index,
+        error_lines,
+    )
+    network_details = new_host_names(network_details, vcenter_index, error_lines)
+    yield "add_date_column", add_date_column, (
+        network_details,
+        network_deployment,
+    )
+
+    # Satellite
+    s_details, s_deployments = read_raw_input(raw / "satellite")
+    satellite_df = drop_empty_rows_columns(
+        normalize_data(s_details, s_deployments, inputs.fact_keys_satellite)[0], "rows"
+    )
+    yield "process_satellite", process_satellite, (
+        satellite_df,
+        vcenter_index,
+    )
+
+    # Deployment details, from the intermediate data of the whole pipeline
+    run_scans(datadir, ["vcenter", "network", "satellite"], rebuild=True)
+    deployment_frames, key_frames = [], []
+    for scan_type in ["vcenter", "network", "satellite"]:
+        scan_data = read_intermediate(
+            datadir,
+            scan_type,
+            source_columns(scan_type) + list(IDENTITY_KEYS[scan_type].values()),
+            rendered=True,
+        )
+        yield f"deployment_from_scan[{scan_type}]", deployment_from_scan, (
+            scan_data,
+            scan_type,
+        )
+        deployment_frames.append(deployment_from_scan(scan_data, scan_type))
+        key_frames.append(identity_keys(scan_data, scan_type))
+    yield "combine_deployments", combine_deployments, (
+        deployment_frames,
+        key_frames,
+    )
+
+    # Validation
+    for scan_type, columns in VALIDATED_SCANS.items():
+        write_gbd_reference(datadir, scan_type)
+        yield f"process_scans[{scan_type}]", process_scans, (
+            datadir,
+            scan_type,
+            *columns,
+        )
+
+
+def run_benchmarks(sizes, repeat, seed):
+    """
+    Benchmarks every stage on a synthetic recon of each size
+
+    Parameters:
+    - sizes (list): Number of hosts of every scan
+    - repeat (int): Number of timed calls of each stage
+    - seed (int): Seed of the synthetic recons
+
+    Returns:
+    - (dict): Measurements of every stage by size, see measure
+    """
+
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} hosts")
+        with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+            datadir = Path(tmp)
+            write_recon(datadir, hosts=size, seed=seed)
+            # The stages report their progress with print
+            with redirect_stdout(devnull):
+                results[str(size)] = {
+                    name: measure(stage, args, repeat)
+                    for name, stage, args in stage_cases(datadir)
+                }
+
+    return results
+
+
+def print_results(results, baseline=None):
+    """
+    Prints the measurements as a table, with the ratio to the baseline when there is one
+
+    Parameters:
+    - results (dict): Measurements of every stage by size, see run_benchmarks
+    - baseline (dict): Measurements of a previous run
+    """
+
+    rows = []
+    for size, stages in results.items():
+        for name, measures in stages.items():
+            previous = (baseline or {}).get(size, {}).get(name)
+            rows.append(
+                {
+                    "hosts": size,
+                    "stage": name,
+                    "seconds": round(measures["seconds"], 4),
+                    "peak_mib": round(measures["peak_mib"], 1),
+                    "vs_baseline": (
+                        round(measures["seconds"] / previous["seconds"], 2)
+                        if previous and previous["seconds"]
+                        else "-"
+                    ),
+                }
+            )
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times and measures the memory of the pipeline stages on synthetic recons"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=Path("benchmarks") / "baseline.json",
+        help="Measurements to compare against",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Record this run as the new baseline",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "pandas": pd.__version__,
+                    "machine": platform.machine(),
+                    "seed": args.seed,
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
+        print(f"Baseline saved to {args.baseline}")
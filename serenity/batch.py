@@ -0,0 +1,347 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+import pandas as pd
+from .__main__ import main
+from .process_scans.os_names import OS_NAME_CACHE, load_os_cache, save_os_cache
+
+# Log of the run of every recon, written in its final report folder
+LOG_FILE_NAME = "serenity.log"
+
+# Process id of the recon being run, written in its final report folder while it runs
+PID_FILE_NAME = "serenity.pid"
+
+
+def find_recons(data_root: Path, patterns):
+    """
+    Finds the recon folders, i.e. the ones with a raw folder, matching names or glob patterns under the data folder
+
+    Parameters:
+    - data_root (Path): Folder holding the recon folders
+    - patterns (list): Names or glob patterns of the recon folders, relative to the data folder e.g. "recon-*"
+
+    Returns:
+    - (list), (list): Recon folders in pattern order without repetitions, patterns matching no recon folder
+    """
+
+    recons, unmatched = {}, []
+    for pattern in patterns:
+        matches = sorted(
+            path for path in Path(data_root).glob(pattern) if (path / "raw").is_dir()
+        )
+        if not matches:
+            unmatched.append(pattern)
+        recons.update(dict.fromkeys(matches))
+
+    return list(recons), unmatched
+
+
+def log_path(datadir: Path):
+    """
+    Location of the log of a recon
+
+    Parameters:
+    - datadir (Path): Folder location of the recon
+
+    Returns:
+    - (Path): Log file path
+    """
+
+    return Path(datadir) / "final_report" / LOG_FILE_NAME
+
+
+def stop_recon_processes(datadir: Path):
+    """
+    Stops the processes left behind by a recon whose process stopped unexpectedly, e.g. the stage workers
+    of its pipeline. They belong to the process group of the recon, see run_recon.
+
+    Parameters:
+    - datadir (Path): Folder location of the recon
+    """
+
+    pid_file = Path(datadir) / "final_report" / PID_FILE_NAME
+    if not os.path.exists(pid_file):
+        return
+
+    with open(pid_file, "r") as f:
+        process_group = int(f.read())
+    try:
+        os.killpg(process_group, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    os.remove(pid_file)
+
+
+def run_recon(datadir: Path, options, os_cache: Path = None):
+    """
+    Runs the pipeline of main on a recon, in a process of its own whose output goes to the log of the recon.
+    A failure is recorded in the log and in the result instead of being raised, so the other recons carry on.
+
+    Parameters:
+    - datadir (Path): Folder location of the recon
+    - options (dict): Arguments of main other than the folder location, see __main__.main
+    - os_cache (Path): JSON file of the OS strings parsed by previous runs, see os_names.load_os_cache
+
+    Returns:
+    - (dict): Status, start time, duration, log and error of the recon, (dict): OS strings parsed so far
+    """
+
+    log_file = log_path(datadir)
+    os.makedirs(log_file.parent, exist_ok=True)
+
+    # The stage workers of the recon join its process group, so they can be stopped if it is killed
+    os.setpgrp()
+    # The batch stops the recon itself when interrupted, see run_batch
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    pid_file = log_file.parent / PID_FILE_NAME
+    with open(pid_file, "w") as f:
+        f.write(str(os.getpid()))
+
+    started = time.time()
+    status, error = "succeeded", None
+    with open(log_file, "w") as log:
+        # Redirected at the file descriptor level, so the worker processes of the stages log there as well
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log.fileno(), sys.stdout.fileno())
+        os.dup2(log.fileno(), sys.stderr.fileno())
+
+        try:
+            if os_cache:
+                load_os_cache(os_cache)
+            main(datadir=Path(datadir), **options)
+        except Exception as exception:
+            traceback.print_exc()
+            status, error = "failed", f"{type(exception).__name__}: {exception}"
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+    os.remove(pid_file)
+
+    return {
+        "folder": str(datadir),
+        "status": status,
+        "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "seconds": round(time.time() - started, 3),
+        "log": str(log_file),
+        "error": error,
+    }, dict(OS_NAME_CACHE)
+
+
+def run_pool(recons, options, jobs=None, os_cache: Path = None):
+    """
+    Runs the recons in a pool of at most jobs processes, every recon in a new process.
+    The recons run in process groups of their own, out of reach of an interruption of the batch, so they are
+    stopped before the pool waits for them.
+
+    Parameters:
+    - recons (list): Folder locations of the recons
+    - options (dict): Arguments of main other than the folder location
+    - jobs (int): Number of recons run at once, defaults to the number of CPUs
+    - os_cache (Path): JSON file of the OS strings parsed by previous runs
+
+    Returns:
+    - (list), (list): Result of every recon that ran (see run_recon), recons whose process stopped unexpectedly
+    """
+
+    results, stopped = [], []
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(run_recon, datadir, options, os_cache): datadir
+            for datadir in recons
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    result, os_names = future.result()
+                except BrokenProcessPool:
+                    stopped.append(futures[future])
+                    continue
+
+                OS_NAME_CACHE.update(os_names)
+                print(f"{result['folder']} {result['status']} in {result['seconds']}s")
+                results.append(result)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for datadir in recons:
+                stop_recon_processes(datadir)
+            raise
+
+    return results, stopped
+
+
+def run_batch(recons, options, jobs=None, os_cache: Path = None):
+    """
+    Runs the pipeline of main on every recon in a bounded process pool, see run_recon.
+    A process stopping unexpectedly (e.g. killed when out of memory) breaks the pool, so the recons it was
+    running or waiting for are run again one at a time, each in a pool of its own, once the processes they
+    left behind are stopped.
+    An interruption (Ctrl-C or SIGTERM) stops every running recon along with its stage workers and is raised again.
+
+    Parameters:
+    - recons (list): Folder locations of the recons
+    - options (dict): Arguments of main other than the folder location
+    - jobs (int): Number of recons run at once, defaults to the number of CPUs
+    - os_cache (Path): JSON file caching the parsed OS strings, updated once every recon ran
+
+    Returns:
+    - (list): Result of every recon, in the order of recons
+    """
+
+    for datadir in recons:
+        # Left by a previous batch, the process group it names is not one of this batch
+        Path(datadir, "final_report", PID_FILE_NAME).unlink(missing_ok=True)
+
+    previous_handler = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        results, stopped = run_pool(recons, options, jobs, os_cache)
+        for datadir in stopped:
+            stop_recon_processes(datadir)
+
+        for datadir in stopped:
+            retried, still_stopped = run_pool([datadir], options, 1, os_cache)
+            results.extend(retried)
+            if still_stopped:
+                stop_recon_processes(datadir)
+                results.append(
+                    {
+                        "folder": str(datadir),
+                        "status": "failed",
+                        "started": None,
+                        "seconds": None,
+                        "log": str(log_path(datadir)),
+                        "error": "The process running the recon stopped unexpectedly",
+                    }
+                )
+    except KeyboardInterrupt:
+        # Recons started while the pool was stopping are only known once it stopped
+        for datadir in recons:
+            stop_recon_processes(datadir)
+        raise
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+    if os_cache and results:
+        save_os_cache(os_cache)
+
+    order = {str(datadir): position for position, datadir in enumerate(recons)}
+
+    return sorted(results, key=lambda result: order[result["folder"]])
+
+
+def write_summary(results, summary_path: Path, seconds):
+    """
+    Writes the status and timings of the batch as JSON
+
+    Parameters:
+    - results (list): Result of every recon, see run_batch
+    - summary_path (Path): JSON file to write the summary to
+    - seconds (float): Duration of the whole batch
+    """
+
+    failed = sum(result["status"] == "failed" for result in results)
+    with open(summary_path, "w") as f:
+        json.dump(
+            {
+                "recons": len(results),
+                "succeeded": len(results) - failed,
+                "failed": failed,
+                "seconds": round(seconds, 3),
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the scripts on a batch of recon folders"
+    )
+    parser.add_argument(
+        "--folders",
+        nargs="+",
+        required=True,
+        help="Names or glob patterns of the recon folders, relative to the data folder",
+    )  # python -m serenity.batch --folders "recon-*" test-data-recon2 --scan vcenter network
+    parser.add_argument(
+        "--data-root",
+        type=Path,
+        default=Path("data"),
+        help="Folder holding the recon folders",
+    )
+    parser.add_argument(
+        "--scan",
+        nargs="+",
+        required=True,
+        help="Specify which scans to process (vcenter, network, satellite)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of recons processed at once, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        default=None,
+        help="JSON file to write the status and timings of the batch to, defaults to batch_summary.json in the data folder",
+    )
+    parser.add_argument("--validate", action="store_true", default=None)
+    parser.add_argument("--write-merged", action="store_true", default=False)
+    parser.add_argument("--keep-all-facts", action="store_true", default=False)
+    parser.add_argument("--fused", action="store_true", default=False)
+    parser.add_argument("--os-cache", type=Path, default=None)
+    parser.add_argument("--export-csv", action="store_true", default=False)
+    parser.add_argument("--rebuild", action="store_true", default=False)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--profile", action="store_true", default=False)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    recons, unmatched = find_recons(args.data_root, args.folders)
+    for pattern in unmatched:
+        print(f"No recon folder matches {pattern} in {args.data_root}")
+    if not recons:
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        results = run_batch(
+            recons,
+            {
+                "validate": args.validate,
+                "scan": args.scan,
+                "write_merged": args.write_merged,
+                "keep_all_facts": args.keep_all_facts,
+                "fused": args.fused,
+                "export_csv": args.export_csv,
+                "rebuild": args.rebuild,
+                "workers": args.workers,
+                "profile": args.profile,
+                "batch_size": args.batch_size,
+            },
+            args.jobs,
+            args.os_cache,
+        )
+    except KeyboardInterrupt:
+        print("Batch interrupted, the running recons were stopped")
+        sys.exit(130)
+
+    summary_path = args.summary or args.data_root / "batch_summary.json"
+    write_summary(results, summary_path, time.perf_counter() - started)
+    table = pd.DataFrame(results)[["folder", "status", "seconds", "error"]]
+    print(table.fillna("-").to_string(index=False))
+    print(f"Summary written to {summary_path}")
+
+    if any(result["status"] == "failed" for result in results):
+        sys.exit(1)
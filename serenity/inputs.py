@@ -1,6 +1,44 @@
-# Test-Data-Recon1: Vcenter scan variables
+# Fact keys consumed by each scan type. Only these facts are flattened from the raw
+# reports unless running with --keep-all-facts. A trailing "*" selects every fact
+# starting with that prefix.
+fact_keys_vcenter = [
+    "vm.name",
+    "vm.os",
+    "vm.state",
+    "vm.dns_name",
+    "vm.uuid",
+    "vm.cluster",
+    "vm.host.*",
+]
+fact_keys_network = [
+    "uname_hostname",
+    "connection_uuid",
+    "etc_machine_id",
+    "dmi_system_uuid",
+    "etc_release_name",
+    "etc_release_version",
+    "virt_virt",
+    "cpu_socket_count",
+    "cpu_core_count",
+    "redhat_packages_gpg_num_rh_packages",
+    "date_*",
+]
+fact_keys_satellite = [
+    "hostname",
+    "uuid",
+    "os_name",
+    "os_version",
+    "virt_type",
+    "is_virtualized",
+    "num_sockets",
+    "cores",
+    "virtual_host_name",
+    "registration_time",
+]
+
+# Test-Data-Recon1: Vcenter scan variables, matching the rows by their number
 # gbd_keys_vcenter = ["index"]
-# auto_keys_vcenter = ["Unnamed: 0"]
+# auto_keys_vcenter = ["row_number"]
 # gbd_cols_vcenter = ["Considered ? (Y/N)", "Duplicate ? (Y/N)"]
 # auto_cols_vcenter = ["Considered", "Duplicate"]
 
@@ -0,0 +1,800 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import numpy as np
+import pandas as pd
+from .process_scans.pre_process import (
+    iter_raw_input,
+    read_raw_input,
+    iter_fact_batches,
+    flatten_facts,
+    compact_frame,
+    normalize_data,
+    drop_empty_rows_columns,
+)
+from .process_scans.v_center import (
+    trim_cm_dns_name,
+    add_considered_comment,
+    split_rh_nonrh,
+    ignore_template_and_discovery,
+    check_duplicates,
+    merge_rn_nonrh,
+    product_name_version,
+)
+from .process_scans.network import (
+    prep_network_data,
+    find_error_lines,
+    check_for_errors,
+    new_host_names,
+    add_date_column,
+    check_num_of_packages,
+)
+from .process_scans.satellite import (
+    trim_hostname,
+    get_install_date,
+    virtwho_check,
+    check_server_type,
+    check_missing_servers,
+    check_nonrhel_servers,
+    check_duplicates_satellite,
+    identify_physical_servers,
+    process_satellite,
+)
+from .process_scans.dtypes import apply_fact_dtypes
+from .process_scans.intermediate import (
+    write_intermediate,
+    read_intermediate,
+    write_intermediate_part,
+    combine_intermediate_parts,
+    iter_intermediate_batches,
+)
+from .process_scans.hostname_index import (
+    HOSTNAME_INDEX_COLUMNS,
+    hostname_index_path,
+    write_hostname_index,
+    read_hostname_index,
+)
+from .process_scans.manifest import (
+    load_manifest,
+    save_manifest,
+    stage_entry,
+    is_stage_current,
+)
+from .process_scans.identity import (
+    IDENTITY_KEYS,
+    identity_keys,
+    resolve_identities,
+    mark_duplicate_clusters,
+)
+from .process_scans.create_deployment_details import (
+    DEPLOYMENT_MAPPINGS,
+    source_columns,
+    deployment_from_scan,
+    combine_deployments,
+)
+from . import inputs
+from .profiling import profiled, run_in_worker, worker_result, PROFILE
+
+# Error message of the network facts that could not be collected
+TARGET_STRING = "Could not"
+
+# Fact keys consumed by every scan type
+FACT_KEYS = {
+    "vcenter": inputs.fact_keys_vcenter,
+    "network": inputs.fact_keys_network,
+    "satellite": inputs.fact_keys_satellite,
+}
+
+# Columns of the Red Hat vCenter servers kept across batches to mark the duplicates, see check_duplicates
+VCENTER_DUPLICATE_KEYS = [
+    "vm.dns_name_trimmed",
+    "vm.name",
+    "vm.state",
+    "Considered",
+    "Comment",
+]
+
+# Fields of the Network system fingerprints kept across batches, see add_date_column
+NETWORK_DEPLOYMENT_KEYS = ["name", "system_creation_date"]
+
+# Columns of the Network servers kept across batches to mark the duplicates, see check_num_of_packages
+NETWORK_DUPLICATE_KEYS = ["uname_hostname", "redhat_packages_gpg_num_rh_packages"]
+
+
+@profiled
+def parse_vcenter(datadir: Path, keep_all_facts=False, write_merged=False):
+    """
+    Raw parsing stage of the vCenter scan
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - write_merged (bool): Also write the merged raw reports
+
+    Returns:
+    - (dataframe): Normalized vCenter data without empty rows
+    """
+
+    print("Start creating vcenter scan")
+    v_details, v_deployments = read_raw_input(datadir / "raw" / "vcenter", write_merged)
+    v_center, v_deployment = normalize_data(
+        v_details,
+        v_deployments,
+        None if keep_all_facts else inputs.fact_keys_vcenter,
+    )
+    v_center = apply_fact_dtypes(v_center, "vcenter")
+
+    return drop_empty_rows_columns(v_center, "rows")
+
+
+@profiled
+def parse_network(datadir: Path, keep_all_facts=False, write_merged=False):
+    """
+    Raw parsing stage of the Network scan, including the error line checks
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - write_merged (bool): Also write the merged raw reports
+
+    Returns:
+    - (dataframe), (dataframe), (Series): Network details, deployments and error lines
+    """
+
+    print("Start creating Network scan")
+    n_details, n_deployments = read_raw_input(datadir / "raw" / "network", write_merged)
+    network_details, network_deployment = prep_network_data(
+        n_details,
+        n_deployments,
+        None if keep_all_facts else inputs.fact_keys_network,
+        TARGET_STRING,
+    )
+    network_details = apply_fact_dtypes(network_details, "network")
+
+    network_details = drop_empty_rows_columns(network_details, "rows")
+    error_lines = find_error_lines(network_details, TARGET_STRING)
+    network_details = check_for_errors(network_details, TARGET_STRING, error_lines)
+
+    return network_details, network_deployment, error_lines
+
+
+@profiled
+def parse_satellite(datadir: Path, keep_all_facts=False, write_merged=False):
+    """
+    Raw parsing stage of the Satellite scan
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - write_merged (bool): Also write the merged raw reports
+
+    Returns:
+    - (dataframe): Normalized Satellite data without empty rows
+    """
+
+    print("Start creating satellite scan")
+    s_details, s_deployments = read_raw_input(
+        datadir / "raw" / "satellite", write_merged
+    )
+    s_details, s_deployment = normalize_data(
+        s_details,
+        s_deployments,
+        None if keep_all_facts else inputs.fact_keys_satellite,
+    )
+    s_details = apply_fact_dtypes(s_details, "satellite")
+
+    return drop_empty_rows_columns(s_details, "rows")
+
+
+@profiled
+def classify_vcenter(final_vcenter):
+    """
+    vCenter classification stage
+
+    Parameters:
+    - final_vcenter (dataframe): Output of parse_vcenter
+
+    Returns:
+    - (dataframe): vCenter intermediate data
+    """
+
+    v_center_trimmed = trim_cm_dns_name(final_vcenter)
+    v_center_cc = add_considered_comment(v_center_trimmed)
+    rh_vcenter, nonrh_vcenter = split_rh_nonrh(v_center_cc)
+    rh_vcenter_temp_disc = ignore_template_and_discovery(rh_vcenter)
+    rh_vcenter_dupes = check_duplicates(rh_vcenter_temp_disc)
+    v_center_merged = merge_rn_nonrh(rh_vcenter_dupes, nonrh_vcenter)
+
+    return product_name_version(v_center_merged)
+
+
+@profiled
+def classify_network(parsed_network, datadir: Path, export_csv=False):
+    """
+    Network cross-scan checks stage against the vCenter hostname index, writes the Network intermediate data
+
+    Parameters:
+    - parsed_network (tuple): Output of parse_network
+    - datadir (Path): Folder location of the datasets
+    - export_csv (bool): Also export the intermediate data as CSV
+    """
+
+    network_details, network_deployment, error_lines = parsed_network
+    network_details = new_host_names(
+        network_details, read_hostname_index(datadir), error_lines
+    )
+    network_details = add_date_column(network_details, network_deployment)
+    network_details = check_num_of_packages(network_details)
+    write_intermediate(network_details, datadir, "network", export_csv)
+    print("Finished Network scan successfully!!!!")
+
+
+def classify_satellite_servers(final_satellite, vcenter_index, fused=False):
+    """
+    Satellite cross-scan checks against the vCenter hostname index
+
+    Parameters:
+    - final_satellite (dataframe): Output of parse_satellite
+    - vcenter_index (Table): vCenter hostname index, see hostname_index.read_hostname_index
+    - fused (bool): Classify the servers in a single fused pass, see satellite.process_satellite
+
+    Returns:
+    - (dataframe): Satellite intermediate data
+    """
+
+    if fused:
+        return process_satellite(final_satellite, vcenter_index)
+
+    satellite_df = trim_hostname(final_satellite)
+    satellite_df = get_install_date(satellite_df)
+    satellite_df = virtwho_check(satellite_df)
+    satellite_df = check_server_type(satellite_df)
+    satellite_df = check_missing_servers(satellite_df)
+    satellite_df = check_nonrhel_servers(satellite_df)
+    satellite_df = check_duplicates_satellite(satellite_df, vcenter_index)
+
+    return identify_physical_servers(satellite_df)
+
+
+@profiled
+def classify_satellite(final_satellite, datadir: Path, export_csv=False, fused=False):
+    """
+    Satellite cross-scan checks stage against the vCenter hostname index, writes the Satellite intermediate data
+
+    Parameters:
+    - final_satellite (dataframe): Output of parse_satellite
+    - datadir (Path): Folder location of the datasets
+    - export_csv (bool): Also export the intermediate data as CSV
+    - fused (bool): Classify the servers in a single fused pass, see satellite.process_satellite
+    """
+
+    satellite_df = classify_satellite_servers(
+        final_satellite, read_hostname_index(datadir), fused
+    )
+    write_intermediate(satellite_df, datadir, "satellite", export_csv)
+    print("Finished Satellite scan successfully!!!!")
+
+
+@profiled
+def parse_fact_batch(facts, scan_type, keep_all_facts=False, retain_text=None):
+    """
+    Raw parsing of a batch of hosts, see pre_process.iter_fact_batches.
+    The facts consumed by the scan type that no host of the batch reported are added as empty columns,
+    so every batch goes through the stages the same way.
+
+    Parameters:
+    - facts (list): Facts dictionary of every host of the batch
+    - scan_type (string): Type of scan
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - retain_text (string): Also keep any other fact whose value contains this text, see pre_process.flatten_facts
+
+    Returns:
+    - (dataframe), (list): Normalized batch without empty rows, raw fact columns reported by its hosts
+    """
+
+    batch_df = compact_frame(
+        flatten_facts(
+            [{"sources": [{"facts": facts}]}],
+            None if keep_all_facts else FACT_KEYS[scan_type],
+            retain_text,
+        )
+    )
+    reported = list(batch_df.columns)
+
+    for column in FACT_KEYS[scan_type]:
+        if not column.endswith("*") and column not in batch_df:
+            batch_df[column] = pd.NA
+    batch_df = apply_fact_dtypes(batch_df, scan_type)
+
+    return drop_empty_rows_columns(batch_df, "rows"), reported
+
+
+@profiled
+def classify_vcenter_batches(
+    datadir: Path, batch_size, keep_all_facts=False, export_csv=False
+):
+    """
+    vCenter parsing and classification stages run on batches of hosts, writes the vCenter intermediate data
+    and hostname index. Only the duplicate keys of the Red Hat servers (see VCENTER_DUPLICATE_KEYS) and
+    the hostname index columns of every VM are kept across batches. The duplicates are marked on these keys
+    once every batch is classified, and written back to the batches of the Red Hat servers.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - batch_size (int): Maximum number of hosts of a batch
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - export_csv (bool): Also export the intermediate data as CSV
+    """
+
+    print("Start creating vcenter scan")
+    fact_columns = {}
+    red_hat_parts, non_red_hat_parts, duplicate_keys, index_keys = [], [], [], []
+
+    batches = iter_fact_batches(datadir / "raw" / "vcenter", batch_size)
+    for number, facts in enumerate(batches):
+        v_center, reported = parse_fact_batch(facts, "vcenter", keep_all_facts)
+        fact_columns.update(dict.fromkeys(reported))
+
+        v_center = product_name_version(
+            add_considered_comment(trim_cm_dns_name(v_center))
+        )
+        index_keys.append(
+            v_center[
+                [column for column in HOSTNAME_INDEX_COLUMNS if column in v_center]
+            ]
+        )
+
+        red_hat, non_red_hat = split_rh_nonrh(v_center)
+        red_hat = ignore_template_and_discovery(red_hat)
+        if not red_hat.empty:
+            duplicate_keys.append(red_hat[VCENTER_DUPLICATE_KEYS])
+            red_hat_parts.append(
+                write_intermediate_part(
+                    red_hat, datadir, "vcenter", f"red_hat_{number}"
+                )
+            )
+        if not non_red_hat.empty:
+            non_red_hat_parts.append(
+                write_intermediate_part(
+                    non_red_hat, datadir, "vcenter", f"non_red_hat_{number}"
+                )
+            )
+
+    if duplicate_keys:
+        marked = check_duplicates(pd.concat(duplicate_keys, ignore_index=True))
+        marked_columns = marked.columns.drop(VCENTER_DUPLICATE_KEYS[:3])
+        start = 0
+        for part_path in red_hat_parts:
+            red_hat = pd.read_parquet(part_path)
+            for column in marked_columns:
+                red_hat[column] = (
+                    marked[column].iloc[start : start + len(red_hat)].to_numpy()
+                )
+            start += len(red_hat)
+            write_intermediate_part(red_hat, datadir, "vcenter", part_path.stem)
+
+    combine_intermediate_parts(
+        red_hat_parts + non_red_hat_parts, datadir, "vcenter", fact_columns, export_csv
+    )
+    write_hostname_index(pd.concat(index_keys, ignore_index=True), datadir)
+
+
+@profiled
+def classify_network_batches(
+    datadir: Path, batch_size, keep_all_facts=False, export_csv=False
+):
+    """
+    Network parsing and cross-scan checks stages run on batches of hosts, writes the Network intermediate data.
+    Only the name and creation date of the system fingerprints (see NETWORK_DEPLOYMENT_KEYS) and the
+    duplicate keys of every server (see NETWORK_DUPLICATE_KEYS) are kept across batches. The duplicates
+    are marked on these keys once every batch is checked, and written back to the batches.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - batch_size (int): Maximum number of hosts of a batch
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - export_csv (bool): Also export the intermediate data as CSV
+    """
+
+    print("Start creating Network scan")
+    raw_path = datadir / "raw" / "network"
+    network_deployment = compact_frame(
+        pd.DataFrame(
+            [
+                {key: fingerprint.get(key) for key in NETWORK_DEPLOYMENT_KEYS}
+                for report in iter_raw_input(raw_path, "deployments.json")
+                for fingerprint in report.get("system_fingerprints") or []
+            ],
+            columns=NETWORK_DEPLOYMENT_KEYS,
+        )
+    )
+    vcenter_index = read_hostname_index(datadir)
+
+    fact_columns = {}
+    parts, duplicate_keys = [], []
+    for number, facts in enumerate(iter_fact_batches(raw_path, batch_size)):
+        network_details, reported = parse_fact_batch(
+            facts, "network", keep_all_facts, TARGET_STRING
+        )
+        fact_columns.update(dict.fromkeys(reported))
+
+        error_lines = find_error_lines(network_details, TARGET_STRING)
+        network_details = check_for_errors(network_details, TARGET_STRING, error_lines)
+        network_details = new_host_names(network_details, vcenter_index, error_lines)
+        network_details = add_date_column(network_details, network_deployment)
+        network_details["redhat_packages_gpg_num_rh_packages"] = pd.to_numeric(
+            network_details["redhat_packages_gpg_num_rh_packages"], errors="coerce"
+        )
+
+        duplicate_keys.append(network_details[NETWORK_DUPLICATE_KEYS])
+        parts.append(
+            write_intermediate_part(network_details, datadir, "network", str(number))
+        )
+
+    if duplicate_keys:
+        marked = check_num_of_packages(pd.concat(duplicate_keys, ignore_index=True))
+        duplicates = marked.get("Considered ?", pd.Series(dtype=object)).eq(True)
+        if duplicates.any():
+            start = 0
+            for part_path in parts:
+                network_details = pd.read_parquet(part_path)
+                rows = duplicates.iloc[start : start + len(network_details)].to_numpy()
+                network_details["Considered ?"] = (
+                    network_details["Considered ?"].astype(object).mask(rows, True)
+                )
+                start += len(network_details)
+                write_intermediate_part(
+                    network_details, datadir, "network", part_path.stem
+                )
+
+    combine_intermediate_parts(parts, datadir, "network", fact_columns, export_csv)
+    print("Finished Network scan successfully!!!!")
+
+
+@profiled
+def classify_satellite_batches(
+    datadir: Path, batch_size, keep_all_facts=False, export_csv=False, fused=False
+):
+    """
+    Satellite parsing and cross-scan checks stages run on batches of hosts, writes the Satellite intermediate data.
+    Every check is done server by server, nothing but the vCenter hostname index is kept across batches.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - batch_size (int): Maximum number of hosts of a batch
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scan
+    - export_csv (bool): Also export the intermediate data as CSV
+    - fused (bool): Classify the servers in a single fused pass, see satellite.process_satellite
+    """
+
+    print("Start creating satellite scan")
+    vcenter_index = read_hostname_index(datadir)
+
+    fact_columns = {}
+    parts = []
+    batches = iter_fact_batches(datadir / "raw" / "satellite", batch_size)
+    for number, facts in enumerate(batches):
+        final_satellite, reported = parse_fact_batch(facts, "satellite", keep_all_facts)
+        fact_columns.update(dict.fromkeys(reported))
+
+        satellite_df = classify_satellite_servers(final_satellite, vcenter_index, fused)
+        parts.append(
+            write_intermediate_part(satellite_df, datadir, "satellite", str(number))
+        )
+
+    combine_intermediate_parts(parts, datadir, "satellite", fact_columns, export_csv)
+    print("Finished Satellite scan successfully!!!!")
+
+
+PARSE_STAGES = {
+    "vcenter": parse_vcenter,
+    "network": parse_network,
+    "satellite": parse_satellite,
+}
+
+
+@profiled
+def run_scans(
+    datadir: Path,
+    scan,
+    write_merged=False,
+    keep_all_facts=False,
+    fused=False,
+    export_csv=False,
+    rebuild=False,
+    workers=None,
+    batch_size=None,
+):
+    """
+    Creates the intermediate data of the requested scans, running the stages as a dependency graph:
+    raw parsing of every scan, then the vCenter classification, then the Network and Satellite cross-scan checks.
+    The raw parsing and cross-scan checks run in a process pool, so the Network and Satellite raw files are
+    parsed while the vCenter classification runs. Stages whose inputs did not change since the previous run
+    reuse their intermediate data, see manifest.is_stage_current.
+    With a batch size, every scan is parsed and classified in batches of hosts (see classify_vcenter_batches),
+    the Network and Satellite scans being processed in the pool once the vCenter scan is done.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan (list): Scan types to process
+    - write_merged (bool): Also write the merged raw reports
+    - keep_all_facts (bool): Flatten every raw fact instead of only the ones consumed by the scans
+    - fused (bool): Classify the Satellite servers in a single fused pass
+    - export_csv (bool): Also export the intermediate data as CSV
+    - rebuild (bool): Process every scan even if its inputs did not change
+    - workers (int): Number of worker processes, defaults to the number of CPUs
+    - batch_size (int): Maximum number of hosts held in memory by a stage, all of them when None
+    """
+
+    if batch_size and write_merged:
+        raise ValueError(
+            "The merged raw reports are not built when processing the scans in batches, run without a batch size."
+        )
+
+    manifest = {} if rebuild else load_manifest(datadir)
+    stage_options = {
+        "keep_all_facts": keep_all_facts,
+        "write_merged": write_merged,
+        "export_csv": export_csv,
+        "batch_size": batch_size,
+    }
+
+    stages = {}
+    if "vcenter" in scan:
+        stages["vcenter"] = stage_entry(datadir, "vcenter", stage_options)
+    vcenter_fingerprint = stages.get("vcenter", manifest.get("vcenter", {})).get(
+        "fingerprint"
+    )
+    if "network" in scan:
+        stages["network"] = stage_entry(
+            datadir, "network", {**stage_options, "vcenter": vcenter_fingerprint}
+        )
+    if "satellite" in scan:
+        stages["satellite"] = stage_entry(
+            datadir,
+            "satellite",
+            {**stage_options, "fused": fused, "vcenter": vcenter_fingerprint},
+        )
+
+    pending = []
+    for scan_type, stage in stages.items():
+        if is_stage_current(manifest, datadir, scan_type, stage):
+            print(f"{scan_type} raw data unchanged, reusing the intermediate scan")
+        else:
+            pending.append(scan_type)
+
+    if not pending:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = {
+            scan_type: executor.submit(
+                run_in_worker,
+                PROFILE["enabled"],
+                PARSE_STAGES[scan_type],
+                datadir,
+                keep_all_facts,
+                write_merged,
+            )
+            for scan_type in ([] if batch_size else pending)
+        }
+
+        # The vCenter classification runs here while the other raw files are parsed
+        if "vcenter" in pending:
+            if batch_size:
+                classify_vcenter_batches(
+                    datadir, batch_size, keep_all_facts, export_csv
+                )
+            else:
+                vcenter_df = classify_vcenter(worker_result(parsed["vcenter"]))
+                write_intermediate(vcenter_df, datadir, "vcenter", export_csv)
+                write_hostname_index(vcenter_df, datadir)
+            manifest["vcenter"] = stages["vcenter"]
+            save_manifest(datadir, manifest)
+            print("Finished Vcenter scan successfully!!!!")
+        elif "network" in pending or "satellite" in pending:
+            if not os.path.exists(hostname_index_path(datadir)):
+                raise ValueError(
+                    "The Network and Satellite scans need the vcenter hostname index, run the vcenter scan first."
+                )
+
+        stage_args = {}
+        if "network" in pending:
+            stage_args["network"] = (
+                (classify_network_batches, datadir, batch_size, keep_all_facts)
+                if batch_size
+                else (classify_network, worker_result(parsed["network"]), datadir)
+            ) + (export_csv,)
+        if "satellite" in pending:
+            stage_args["satellite"] = (
+                (classify_satellite_batches, datadir, batch_size, keep_all_facts)
+                if batch_size
+                else (classify_satellite, worker_result(parsed["satellite"]), datadir)
+            ) + (export_csv, fused)
+
+        classified = {
+            scan_type: executor.submit(run_in_worker, PROFILE["enabled"], *args)
+            for scan_type, args in stage_args.items()
+        }
+
+        for scan_type, future in classified.items():
+            worker_result(future)
+            manifest[scan_type] = stages[scan_type]
+            save_manifest(datadir, manifest)
+
+
+@profiled
+def build_deployment_details(datadir: Path, scan, batch_size=None):
+    """
+    Final stage creating the deployment details report from the intermediate data of the scans
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan (list): Scan types to include, in report order
+    - batch_size (int): Maximum number of rows of an intermediate scan held in memory, all of them when None,
+      see build_deployment_details_batches
+    """
+
+    if batch_size:
+        build_deployment_details_batches(datadir, scan, batch_size)
+        return
+
+    print("Start creating deployment details scan")
+
+    deployment_frames, key_frames = [], []
+    for scan_type in scan:
+        if scan_type in DEPLOYMENT_MAPPINGS:
+            scan_data = read_intermediate(
+                datadir,
+                scan_type,
+                source_columns(scan_type) + list(IDENTITY_KEYS[scan_type].values()),
+                rendered=True,
+            )
+            deployment_frames.append(deployment_from_scan(scan_data, scan_type))
+            key_frames.append(identity_keys(scan_data, scan_type))
+        else:
+            print(f"Unsupported scan type: {scan_type}")
+
+    combined_deployment_df = (
+        combine_deployments(deployment_frames, key_frames)
+        if deployment_frames
+        else pd.DataFrame()
+    )
+
+    if not combined_deployment_df.empty:
+        # Save the deployment details
+        combined_deployment_df.to_csv(
+            datadir / "final_report" / "deployment_details_auto_generated.csv",
+            index=False,
+        )
+        print("Deployment_details scan created")
+
+
+def iter_deployment_batches(datadir: Path, scan_types, batch_size):
+    """
+    Builds the deployment details of the intermediate data of the scans in batches of rows
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_types (list): Scan types to include, in report order
+    - batch_size (int): Maximum number of rows of a batch
+
+    Returns:
+    - generator: Deployment details of the batch, rendered intermediate data and type of scan it comes from
+    """
+
+    for scan_type in scan_types:
+        for scan_data in iter_intermediate_batches(
+            datadir,
+            scan_type,
+            batch_size,
+            source_columns(scan_type) + list(IDENTITY_KEYS[scan_type].values()),
+            rendered=True,
+        ):
+            yield deployment_from_scan(scan_data, scan_type), scan_data, scan_type
+
+
+def unique_deployment_rows(datadir: Path, scan_types, batch_size, row_hashes):
+    """
+    Finds the deployment details rows not repeating a previous row, as combine_deployments does.
+    Rows with distinct hashes are distinct, so only the rows sharing their hash with another one are read
+    again and compared in full, a hash collision never dropping a distinct row.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_types (list): Scan types to include, in report order
+    - batch_size (int): Maximum number of rows of a batch
+    - row_hashes (series): Hash of every deployment details row, in report order
+
+    Returns:
+    - (array): Boolean mask of the rows to keep, in report order
+    """
+
+    repeated = row_hashes.duplicated(keep=False).to_numpy()
+    unique_rows = np.ones(len(row_hashes), dtype=bool)
+    if not repeated.any():
+        return unique_rows
+
+    candidates, start = [], 0
+    for deployment_df, _, _ in iter_deployment_batches(datadir, scan_types, batch_size):
+        candidates.append(deployment_df[repeated[start : start + len(deployment_df)]])
+        start += len(deployment_df)
+    unique_rows[repeated] = (
+        ~pd.concat(candidates, ignore_index=True).duplicated().to_numpy()
+    )
+
+    return unique_rows
+
+
+@profiled
+def build_deployment_details_batches(datadir: Path, scan, batch_size):
+    """
+    Deployment details stage reading the intermediate data of the scans in batches of rows.
+    Only a hash of every row, the identifiers, VM name, Source and Considered flag of the records are kept across
+    batches, to drop the repeated rows (see unique_deployment_rows) and mark the duplicate machines as
+    combine_deployments does. The report is then built again and written one batch at a time.
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan (list): Scan types to include, in report order
+    - batch_size (int): Maximum number of rows of a batch
+    """
+
+    print("Start creating deployment details scan")
+
+    scan_types = []
+    for scan_type in scan:
+        if scan_type in DEPLOYMENT_MAPPINGS:
+            scan_types.append(scan_type)
+        else:
+            print(f"Unsupported scan type: {scan_type}")
+
+    key_frames, decisions, row_hashes = [], [], []
+    for deployment_df, scan_data, scan_type in iter_deployment_batches(
+        datadir, scan_types, batch_size
+    ):
+        keys = identity_keys(scan_data, scan_type)
+        keys["vm_name"] = deployment_df["VM_Name"].astype("string[pyarrow]")
+        key_frames.append(keys)
+        decisions.append(
+            deployment_df[["Source", "Considered?(Y/N)"]].astype("category")
+        )
+        row_hashes.append(pd.util.hash_pandas_object(deployment_df, index=False))
+
+    if not key_frames:
+        return
+
+    unique_rows = unique_deployment_rows(
+        datadir, scan_types, batch_size, pd.concat(row_hashes, ignore_index=True)
+    )
+    combined_keys = pd.concat(key_frames, ignore_index=True)[unique_rows]
+    marks = mark_duplicate_clusters(
+        pd.concat(decisions, ignore_index=True)
+        .astype(object)[unique_rows]
+        .reset_index(drop=True),
+        resolve_identities(combined_keys.reset_index(drop=True)),
+    )
+    del key_frames, decisions, row_hashes, combined_keys
+
+    report_path = datadir / "final_report" / "deployment_details_auto_generated.csv"
+    start, written = 0, 0
+    for deployment_df, _, _ in iter_deployment_batches(datadir, scan_types, batch_size):
+        batch_rows = unique_rows[start : start + len(deployment_df)]
+        start += len(deployment_df)
+        deployment_df = deployment_df[batch_rows].reset_index(drop=True)
+        if deployment_df.empty:
+            continue
+
+        batch_marks = marks.iloc[written : written + len(deployment_df)]
+        for column in ["Cluster_ID", "Duplicate?(Y/N)", "Considered?(Y/N)"]:
+            deployment_df[column] = batch_marks[column].to_numpy()
+        duplicates = (batch_marks["Duplicate?(Y/N)"] == "Y").to_numpy()
+        deployment_df.loc[duplicates, "Comments"] = "Duplicate entries"
+
+        deployment_df.to_csv(
+            report_path, mode="a" if written else "w", header=not written, index=False
+        )
+        written += len(deployment_df)
+
+    if written:
+        print("Deployment_details scan created")
@@ -1,174 +1,237 @@
 import pandas as pd
 import numpy as np
-import os
 from datetime import date
+from .identity import resolve_identities, mark_duplicate_clusters
+from ..profiling import profiled
 
+# Define the deployment details columns
+DEPLOYMENT_DETAILS_COLUMNS = [
+    "Source",
+    "Product_Installed",
+    "Product_Version",
+    "RH_Packages_Installed",
+    "Operating_System_Hostname",
+    "VM_Name",
+    "Physical/Virtual",
+    "Physical_Sockets",
+    "Socket_Pair",
+    "Cores/vCPU_Count",
+    "If_Virtual,Hosted_by",
+    "If_Virtual,Sockets_on_Host",
+    "If_Virtual,_Host_Cluster_name",
+    "Install_Date/Profile_Creation_Date",
+    "Decomm_Date/Last_Active_date",
+    "RHEL_ELS?",
+    "Jboss_Type",
+    "Hyperthreading(True/False)",
+    "Ansible/OpenShift",
+    "RHEL_Group_(Instance/Host based)",
+    "Duplicate?(Y/N)",
+    "Considered?(Y/N)",
+    "Comments",
+]
 
-def create_dd_df():
-    # Define the deployment details columns
-    deployment_details_columns = [
-        "Source",
-        "Product_Installed",
-        "Product_Version",
-        "RH_Packages_Installed",
-        "Operating_System_Hostname",
-        "VM_Name",
-        "Physical/Virtual",
-        "Physical_Sockets",
-        "Socket_Pair",
-        "Cores/vCPU_Count",
-        "If_Virtual,Hosted_by",
-        "If_Virtual,Sockets_on_Host",
-        "If_Virtual,_Host_Cluster_name",
-        "Install_Date/Profile_Creation_Date",
-        "Decomm_Date/Last_Active_date",
-        "RHEL_ELS?",
-        "Jboss_Type",
-        "Hyperthreading(True/False)",
-        "Ansible/OpenShift",
-        "RHEL_Group_(Instance/Host based)",
-        "Duplicate?(Y/N)",
-        "Considered?(Y/N)",
-        "Comments",
-    ]
-
-    # Create an empty DataFrame for deployment details
-    deployment_details_df = pd.DataFrame(columns=deployment_details_columns)
-
-    return deployment_details_df
-
-
-# Function to read data from a CSV file if it exists, else return an empty DataFrame
-def read_csv_file(file_path):
-    if os.path.exists(file_path):
-        return pd.read_csv(file_path)
-    else:
-        return pd.DataFrame()
-
-
-# Function to fill deployment details from VCenter data
-def fill_deployment_from_vcenter(deployment_df, vcenter_data):
+# Enumerations of the deployment details, stored as categoricals once the duplicates are marked
+DEPLOYMENT_CATEGORIES = [
+    "Source",
+    "Physical/Virtual",
+    "RHEL_ELS?",
+    "Jboss_Type",
+    "Hyperthreading(True/False)",
+    "Ansible/OpenShift",
+    "RHEL_Group_(Instance/Host based)",
+    "Duplicate?(Y/N)",
+    "Considered?(Y/N)",
+    "Comments",
+]
+
+# Columns filled the same way for every scan type, as (kind, argument):
+# - ("column", name): Column of the intermediate scan, "-" if the scan did not report it
+# - ("constant", value): Same value for every server
+# - ("socket_pair", name): Number of socket pairs from the socket count column of the intermediate scan
+# - ("today", None): Date of the run
+COMMON_MAPPING = {
+    "Decomm_Date/Last_Active_date": ("today", None),
+    "RHEL_ELS?": ("constant", "-"),
+    "Jboss_Type": ("constant", "-"),
+    "Hyperthreading(True/False)": ("constant", "-"),
+    "Ansible/OpenShift": ("constant", "-"),
+    "RHEL_Group_(Instance/Host based)": ("constant", " "),
+}
+
+# How the deployment details columns are filled from each intermediate scan, see COMMON_MAPPING
+DEPLOYMENT_MAPPINGS = {
+    "vcenter": {
+        **COMMON_MAPPING,
+        "Source": ("constant", "vcenter"),
+        "Product_Installed": ("column", "Product Name"),
+        "Product_Version": ("column", "Version"),
+        "RH_Packages_Installed": ("constant", "-"),
+        "Operating_System_Hostname": ("column", "vm.dns_name"),
+        "VM_Name": ("column", "vm.name"),
+        "Physical/Virtual": ("constant", "Virtual"),
+        "Physical_Sockets": ("constant", "-"),
+        "Socket_Pair": ("constant", "-"),
+        "Cores/vCPU_Count": ("constant", "-"),
+        "If_Virtual,Hosted_by": ("column", "vm.host.name"),
+        "If_Virtual,Sockets_on_Host": ("column", "vm.host.socket_count"),
+        "If_Virtual,_Host_Cluster_name": ("column", "vm.cluster"),
+        "Install_Date/Profile_Creation_Date": ("constant", "-"),
+        "Duplicate?(Y/N)": ("constant", " "),
+        "Considered?(Y/N)": ("column", "Considered"),
+        "Comments": ("constant", " "),
+    },
+    "network": {
+        **COMMON_MAPPING,
+        "Source": ("constant", "Network"),
+        "Product_Installed": ("column", "etc_release_name"),
+        "Product_Version": ("column", "etc_release_version"),
+        "RH_Packages_Installed": ("column", "redhat_packages_gpg_num_rh_packages"),
+        "Operating_System_Hostname": ("column", "uname_hostname"),
+        "VM_Name": ("column", "uname_hostname"),
+        "Physical/Virtual": ("column", "virt_virt"),
+        "Physical_Sockets": ("column", "cpu_socket_count"),
+        "Socket_Pair": ("socket_pair", "cpu_socket_count"),
+        "Cores/vCPU_Count": ("column", "cpu_core_count"),
+        "If_Virtual,Hosted_by": ("constant", "-"),
+        "If_Virtual,Sockets_on_Host": ("constant", "-"),
+        "If_Virtual,_Host_Cluster_name": ("constant", "-"),
+        "Install_Date/Profile_Creation_Date": (
+            "column",
+            "Creation Date / Install date",
+        ),
+        "Duplicate?(Y/N)": ("constant", " "),
+        "Considered?(Y/N)": ("column", "Considered ?"),
+        "Comments": ("column", "Comment"),
+    },
+    "satellite": {
+        **COMMON_MAPPING,
+        "Source": ("constant", "Satellite"),
+        "Product_Installed": ("column", "os_name"),
+        "Product_Version": ("column", "os_version"),
+        "RH_Packages_Installed": ("constant", "-"),
+        "Operating_System_Hostname": ("column", "hostname"),
+        "VM_Name": ("column", "hostname"),
+        "Physical/Virtual": ("column", "phy_vir"),
+        "Physical_Sockets": ("column", "num_sockets"),
+        "Socket_Pair": ("socket_pair", "num_sockets"),
+        "Cores/vCPU_Count": ("column", "cores"),
+        "If_Virtual,Hosted_by": ("column", "virtual_host_name"),
+        "If_Virtual,Sockets_on_Host": ("constant", "-"),
+        "If_Virtual,_Host_Cluster_name": ("constant", "-"),
+        "Install_Date/Profile_Creation_Date": ("column", "install_date"),
+        "Duplicate?(Y/N)": ("column", "Duplicate"),
+        "Considered?(Y/N)": ("column", "Considered"),
+        "Comments": ("column", "Comment"),
+    },
+}
+
+
+def source_columns(scan_type):
     """
-    This function copies the relevant columns in from VCenter intermediate scan
-    to deployment details. If the intermediate scan is not present, then the process is ignored.
+    Columns of the intermediate scan read by the deployment details mapping
+
+    Parameters:
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (list): Intermediate scan columns
     """
-    print("Start copying from vcenter intermediate scan")
-    if not vcenter_data.empty:
-        deployment_df["Product_Installed"] = vcenter_data.get("Product Name", "-")
-        deployment_df["Product_Version"] = vcenter_data.get("Version", "-")
-        deployment_df["RH_Packages_Installed"] = "-"
-        deployment_df["Operating_System_Hostname"] = vcenter_data.get(
-            "vm.dns_name", "-"
-        )
-        deployment_df["VM_Name"] = vcenter_data.get("vm.name", "-")
-        deployment_df["Physical/Virtual"] = "Virtual"
-        deployment_df["Physical_Sockets"] = "-"
-        deployment_df["Socket_Pair"] = "-"
-        deployment_df["Cores/vCPU_Count"] = "-"
-        deployment_df["If_Virtual,Hosted_by"] = vcenter_data.get("vm.host.name", "-")
-        deployment_df["If_Virtual,Sockets_on_Host"] = vcenter_data.get(
-            "vm.host.socket_count", "-"
-        )
-        deployment_df["If_Virtual,_Host_Cluster_name"] = vcenter_data.get(
-            "vm.cluster", "-"
+
+    return list(
+        dict.fromkeys(
+            argument
+            for kind, argument in DEPLOYMENT_MAPPINGS[scan_type].values()
+            if kind in ("column", "socket_pair")
         )
-        deployment_df["Install_Date/Profile_Creation_Date"] = "-"
-        deployment_df["Decomm_Date/Last_Active_date"] = date.today()
-        deployment_df["RHEL_ELS?"] = "-"
-        deployment_df["Jboss_Type"] = "-"
-        deployment_df["Hyperthreading(True/False)"] = "-"
-        deployment_df["Ansible/OpenShift"] = "-"
-        deployment_df["RHEL_Group_(Instance/Host based)"] = " "
-        deployment_df["Duplicate?(Y/N)"] = " "
-        deployment_df["Considered?(Y/N)"] = " "
-        deployment_df["Comments"] = " "
-        deployment_df["Source"] = "vcenter"
-
-        deployment_df.drop_duplicates(inplace=True)
-    return deployment_df
-
-
-# Function to fill deployment details from Network data
-def fill_deployment_from_network(deployment_df, network_data):
+    )
+
+
+def map_column(scan_data, kind, argument):
     """
-    This function copies the relevant columns in from Network intermediate scan
-    to deployment details. If the intermediate scan is not present, then the process is ignored.
+    Values of a deployment details column, see COMMON_MAPPING
+
+    Parameters:
+    - scan_data (dataframe): Intermediate scan data
+    - kind (string): How the column is filled
+    - argument: Column name or constant value
+
+    Returns:
+    - (Series) or scalar: Values of the column, a scalar is the same for every server
     """
-    print("Start copying from Network intermediate scan")
-    if not network_data.empty:
-        deployment_df["Product_Installed"] = network_data.get("etc_release_name", "-")
-        deployment_df["Product_Version"] = network_data.get("etc_release_version", "-")
-        deployment_df["RH_Packages_Installed"] = network_data.get(
-            "redhat_packages_gpg_num_rh_packages", "-"
-        )
-        deployment_df["Operating_System_Hostname"] = network_data.get(
-            "uname_hostname", "-"
-        )
-        deployment_df["VM_Name"] = network_data.get("uname_hostname", "-")
-        deployment_df["Physical/Virtual"] = network_data.get("virt_virt", "-")
-        deployment_df["Physical_Sockets"] = network_data.get("cpu_socket_count", "-")
-        deployment_df["Socket_Pair"] = np.ceil(
-            deployment_df["Physical_Sockets"].replace("-", "0").astype(float) / 2
-        )
-        deployment_df["Cores/vCPU_Count"] = network_data.get("cpu_core_count", "-")
-        deployment_df["If_Virtual,Hosted_by"] = "-"
-        deployment_df["If_Virtual,Sockets_on_Host"] = "-"
-        deployment_df["If_Virtual,_Host_Cluster_name"] = "-"
-        deployment_df["Install_Date/Profile_Creation_Date"] = network_data.get(
-            "Creation Date / Install date", "-"
-        )
-        deployment_df["Decomm_Date/Last_Active_date"] = date.today()
-        deployment_df["RHEL_ELS?"] = "-"
-        deployment_df["Jboss_Type"] = "-"
-        deployment_df["Hyperthreading(True/False)"] = "-"
-        deployment_df["Ansible/OpenShift"] = "-"
-        deployment_df["RHEL_Group_(Instance/Host based)"] = " "
-        deployment_df["Duplicate?(Y/N)"] = " "
-        deployment_df["Considered?(Y/N)"] = network_data.get("Considered ?", "-")
-        deployment_df["Comments"] = network_data.get("Comment", "-")
-        deployment_df["Source"] = "Network"
-
-        deployment_df.drop_duplicates(inplace=True)
-    return deployment_df
-
-
-# Function to fill deployment details from Satellite data
-def fill_deployment_from_satellite(deployment_df, satellite_data):
+
+    if kind == "constant":
+        return argument
+    if kind == "today":
+        return date.today()
+    if argument not in scan_data:
+        return "-" if kind == "column" else 0.0
+    if kind == "column":
+        return scan_data[argument]
+    if kind == "socket_pair":
+        sockets = pd.to_numeric(scan_data[argument], errors="coerce").fillna(0)
+        return np.ceil(sockets / 2)
+
+    raise ValueError(f"Unknown deployment details mapping: {kind}")
+
+
+@profiled
+def deployment_from_scan(scan_data, scan_type):
     """
-    This function copies the relevant columns in from Satellite intermediate scan
-    to deployment details. If the intermediate scan is not present, then the process is ignored.
+    Builds the deployment details of an intermediate scan in a single allocation.
+    If the intermediate scan is not present, then there are no deployment details.
+
+    Parameters:
+    - scan_data (dataframe): Rendered intermediate scan data
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (dataframe): Deployment details, one row per server of the scan
     """
-    print("Start copying from Satellite intermediate scan")
-    if not satellite_data.empty:
-        deployment_df["Product_Installed"] = satellite_data.get("os_name", "-")
-        deployment_df["Product_Version"] = satellite_data.get("os_version", "-")
-        deployment_df["RH_Packages_Installed"] = "-"
-        deployment_df["Operating_System_Hostname"] = satellite_data.get("hostname", "-")
-        deployment_df["VM_Name"] = satellite_data.get("hostname", "-")
-        deployment_df["Physical/Virtual"] = satellite_data.get("phy_vir", "-")
-        deployment_df["Physical_Sockets"] = satellite_data.get("num_sockets", "-")
-        deployment_df["Socket_Pair"] = np.ceil(
-            deployment_df["Physical_Sockets"].replace("-", "0").astype(float) / 2
-        )
-        deployment_df["Cores/vCPU_Count"] = satellite_data.get("cores", "-")
-        deployment_df["If_Virtual,Hosted_by"] = satellite_data.get(
-            "virtual_host_name", "-"
-        )
-        deployment_df["If_Virtual,Sockets_on_Host"] = "-"
-        deployment_df["If_Virtual,_Host_Cluster_name"] = "-"
-        deployment_df["Install_Date/Profile_Creation_Date"] = satellite_data.get(
-            "install_date", "-"
-        )
-        deployment_df["Decomm_Date/Last_Active_date"] = date.today()
-        deployment_df["RHEL_ELS?"] = "-"
-        deployment_df["Jboss_Type"] = "-"
-        deployment_df["Hyperthreading(True/False)"] = "-"
-        deployment_df["Ansible/OpenShift"] = "-"
-        deployment_df["RHEL_Group_(Instance/Host based)"] = " "
-        deployment_df["Duplicate?(Y/N)"] = satellite_data.get("Duplicate", "-")
-        deployment_df["Considered?(Y/N)"] = satellite_data.get("Considered", "-")
-        deployment_df["Comments"] = satellite_data.get("Comment", "-")
-        deployment_df["Source"] = "Satellite"
-
-        deployment_df.drop_duplicates(inplace=True)
-    return deployment_df
+
+    mapping = DEPLOYMENT_MAPPINGS[scan_type]
+    print(f"Start copying from {mapping['Source'][1]} intermediate scan")
+
+    if scan_data.empty:
+        return pd.DataFrame(columns=DEPLOYMENT_DETAILS_COLUMNS)
+
+    return pd.DataFrame(
+        {
+            column: map_column(scan_data, *mapping[column])
+            for column in DEPLOYMENT_DETAILS_COLUMNS
+        },
+        index=scan_data.index,
+    )
+
+
+@profiled
+def combine_deployments(deployment_frames, key_frames):
+    """
+    Concatenates the deployment details of all the scans at once and marks the duplicate machines,
+    linking the records that share a strong identifier or VM name (see identity.resolve_identities)
+
+    Parameters:
+    - deployment_frames (list): Deployment details of every scan, see deployment_from_scan
+    - key_frames (list): Identifiers of the records of every scan, see identity.identity_keys
+
+    Returns:
+    - (dataframe): Combined deployment details with a Cluster_ID per machine
+    """
+
+    combined_deployment_df = pd.concat(deployment_frames, ignore_index=True)
+    combined_keys = pd.concat(key_frames, ignore_index=True)
+
+    unique_rows = ~combined_deployment_df.duplicated()
+    combined_deployment_df = combined_deployment_df[unique_rows].reset_index(drop=True)
+    combined_keys = combined_keys[unique_rows].reset_index(drop=True)
+    combined_keys["vm_name"] = combined_deployment_df["VM_Name"].astype(
+        "string[pyarrow]"
+    )
+
+    combined_deployment_df = mark_duplicate_clusters(
+        combined_deployment_df, resolve_identities(combined_keys)
+    )
+
+    return combined_deployment_df.astype(
+        dict.fromkeys(DEPLOYMENT_CATEGORIES, "category")
+    )
@@ -0,0 +1,75 @@
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Format of the dates in the intermediate and final reports e.g. 3/30/2023
+REPORT_DATE_FORMAT = "%-m/%-d/%-Y"
+
+
+def strip_timezone(timestamps):
+    """
+    Drops the timezone of parsed dates, keeping their local wall time
+
+    Parameters:
+    - timestamps (Series): Parsed dates, timezone aware or not
+
+    Returns:
+    - (Series): Timezone naive dates
+    """
+
+    if isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+        return timestamps.dt.tz_localize(None)
+
+    return timestamps
+
+
+def parse_single_date(value):
+    """
+    Parses a single date guessing its format, used for the values not matching the format of their column
+
+    Parameters:
+    - value: Date string
+
+    Returns:
+    - (Timestamp): Timezone naive date, NaT if it can not be parsed
+    """
+
+    timestamp = pd.to_datetime(value, errors="coerce")
+    if timestamp is not pd.NaT and timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_localize(None)
+
+    return timestamp
+
+
+def parse_dates(values):
+    """
+    Parses a whole column of date strings in one call.
+    The format is detected once from the first value, the few values not matching it are parsed one by one.
+
+    Parameters:
+    - values (Series): Date strings, missing values and "-" are allowed
+
+    Returns:
+    - (Series): Timezone naive datetime64 dates, NaT where missing or not a date
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return strip_timezone(values)
+
+    values = values.astype(object).where(values.notna() & (values != "-"))
+    present = values.dropna()
+    if present.empty:
+        return pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+    date_format = guess_datetime_format(str(present.iloc[0]))
+    dates = pd.to_datetime(values, format=date_format, errors="coerce")
+    if dates.dtype == object:
+        # Mixed UTC offsets can not be held by a single column, they are parsed one by one
+        dates = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    dates = strip_timezone(dates)
+
+    unparsed = dates.isna() & values.notna()
+    if unparsed.any():
+        dates = dates.astype("datetime64[ns]")
+        dates[unparsed] = values[unparsed].map(parse_single_date)
+
+    return dates.astype("datetime64[ns]")
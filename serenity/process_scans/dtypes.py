@@ -0,0 +1,107 @@
+import pandas as pd
+from ..profiling import profiled
+
+# Dtype of the raw facts of every scan type, applied right after normalization (see apply_fact_dtypes):
+# - "category": Enumerations with a handful of distinct values
+# - "string": Identifiers and names, stored as Arrow strings
+# - "number": Counts, stored as nullable integers (floats if some are not whole numbers)
+# Facts of mixed python values (lists, dicts, error messages in a count) keep their dtype.
+FACT_DTYPES = {
+    "vcenter": {
+        "vm.state": "category",
+        "vm.os": "category",
+        "vm.cluster": "category",
+        "vm.host.name": "category",
+        "vm.name": "string",
+        "vm.dns_name": "string",
+        "vm.uuid": "string",
+        "vm.host.uuid": "string",
+        "vm.cpu_count": "number",
+        "vm.host.socket_count": "number",
+        "vm.host.cpu_count": "number",
+        "vm.host.cpu_cores": "number",
+        "vm.host.cpu_threads": "number",
+    },
+    "network": {
+        "etc_release_name": "category",
+        "etc_release_version": "category",
+        "virt_virt": "category",
+        "virt_type": "category",
+        "uname_hostname": "string",
+        "connection_uuid": "string",
+        "etc_machine_id": "string",
+        "dmi_system_uuid": "string",
+        "subscription_manager_id": "string",
+        "cpu_socket_count": "number",
+        "cpu_core_count": "number",
+        "cpu_count": "number",
+        "redhat_packages_gpg_num_rh_packages": "number",
+    },
+    "satellite": {
+        "os_name": "category",
+        "os_version": "category",
+        "virt_type": "category",
+        "is_virtualized": "category",
+        "virtual_host_name": "category",
+        "hostname": "string",
+        "uuid": "string",
+        "num_sockets": "number",
+        "cores": "number",
+    },
+}
+
+
+def to_number(values):
+    """
+    Converts a count column to a nullable numeric dtype
+
+    Parameters:
+    - values (Series): Raw fact values
+
+    Returns:
+    - (Series): Int64 values, Float64 if some are not whole numbers, or the values as is if they are already
+      integers or some are not numbers
+    """
+
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values
+
+    try:
+        numbers = pd.to_numeric(values, errors="coerce")
+    except (TypeError, ValueError):
+        return values
+
+    if numbers.isna().sum() != values.isna().sum():
+        return values
+
+    whole = (numbers.dropna() % 1 == 0).all()
+
+    return numbers.astype("Int64" if whole else "Float64")
+
+
+@profiled
+def apply_fact_dtypes(df, scan_type):
+    """
+    Applies the dtype policy of a scan type to its normalized facts, see FACT_DTYPES
+
+    Parameters:
+    - df (dataframe): Normalized facts
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (dataframe): Facts with categorical enumerations, Arrow string identifiers and numeric counts
+    """
+
+    for column, kind in FACT_DTYPES[scan_type].items():
+        if column not in df.columns:
+            continue
+
+        values = df[column]
+        if kind == "number":
+            df[column] = to_number(values)
+        elif pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+            df[column] = values.astype(
+                "category" if kind == "category" else "string[pyarrow]"
+            )
+
+    return df
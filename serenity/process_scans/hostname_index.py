@@ -0,0 +1,101 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# vCenter columns kept in the hostname index, the trimmed DNS name being the lookup key
+HOSTNAME_INDEX_COLUMNS = ["vm.dns_name_trimmed", "vm.uuid", "vm.host.uuid"]
+
+
+def hostname_index_path(datadir: Path):
+    """
+    Location of the vCenter hostname index
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+
+    Returns:
+    - (Path): Hostname index file path
+    """
+
+    return Path(datadir) / "intermediate" / "vcenter" / "vcenter_hostname_index.arrow"
+
+
+def build_hostname_index(vcenter_df):
+    """
+    Builds the hostname index of the vCenter intermediate data, sorted by trimmed DNS name
+
+    Parameters:
+    - vcenter_df (dataframe): vCenter intermediate data
+
+    Returns:
+    - (Table): Arrow table with the trimmed DNS name and uuids of every VM
+    """
+
+    columns = [column for column in HOSTNAME_INDEX_COLUMNS if column in vcenter_df]
+    index = pa.Table.from_pandas(
+        vcenter_df[columns].astype("string[pyarrow]"), preserve_index=False
+    )
+
+    return index.sort_by("vm.dns_name_trimmed")
+
+
+def write_hostname_index(vcenter_df, datadir: Path):
+    """
+    Writes the hostname index of the vCenter intermediate data as an Arrow IPC file
+
+    Parameters:
+    - vcenter_df (dataframe): vCenter intermediate data
+    - datadir (Path): Folder location of the datasets
+    """
+
+    index = build_hostname_index(vcenter_df)
+    with pa.OSFile(str(hostname_index_path(datadir)), "wb") as sink:
+        with pa.ipc.new_file(sink, index.schema) as writer:
+            writer.write_table(index)
+
+
+def read_hostname_index(datadir: Path):
+    """
+    Memory-maps the vCenter hostname index, nothing is copied until the index is used
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+
+    Returns:
+    - (Table): Arrow table written by write_hostname_index
+    """
+
+    source = pa.memory_map(str(hostname_index_path(datadir)), "r")
+
+    return pa.ipc.open_file(source).read_all()
+
+
+def in_vcenter(hostnames, vcenter):
+    """
+    Checks which hostnames are VMs reported in vCenter, with a hash lookup per hostname
+
+    Parameters:
+    - hostnames (Series): Trimmed hostnames to look up
+    - vcenter: vCenter hostname index (see read_hostname_index) or vCenter intermediate dataframe
+
+    Returns:
+    - (Series): Boolean Series aligned with hostnames, True if the hostname is in vCenter
+    """
+
+    if isinstance(vcenter, pa.Table):
+        dns_names = vcenter.column("vm.dns_name_trimmed").combine_chunks()
+    else:
+        dns_names = pa.array(
+            vcenter["vm.dns_name_trimmed"].astype(object),
+            type=pa.string(),
+            from_pandas=True,
+        )
+
+    found = pc.is_in(
+        pa.array(hostnames.astype(object), type=pa.string(), from_pandas=True),
+        value_set=dns_names,
+    )
+
+    return pd.Series(np.asarray(found), index=hostnames.index)
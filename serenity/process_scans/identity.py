@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from ..profiling import profiled
+
+# Strong identifiers of a machine in each intermediate scan, by identifier type.
+# Records sharing the value of any identifier type are the same machine.
+IDENTITY_KEYS = {
+    "vcenter": {
+        "uuid": "vm.uuid",
+        "hostname": "vm.dns_name_trimmed",
+    },
+    "network": {
+        "uuid": "dmi_system_uuid",
+        "machine_id": "etc_machine_id",
+        "connection_uuid": "connection_uuid",
+        "hostname": "uname_hostname",
+    },
+    "satellite": {
+        "uuid": "uuid",
+        "hostname": "hostname_trimmed",
+    },
+}
+
+# Identifier values that do not identify a machine
+IGNORED_IDENTIFIERS = ["", "-", "localhost"]
+
+
+def identity_keys(scan_data, scan_type):
+    """
+    Gets the strong identifiers of every record of an intermediate scan
+
+    Parameters:
+    - scan_data (dataframe): Intermediate scan data
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (dataframe): One column per identifier type of the scan, lower cased, aligned with scan_data
+    """
+
+    return pd.DataFrame(
+        {
+            identifier: (
+                scan_data[column].astype("string[pyarrow]").str.strip().str.lower()
+                if column in scan_data
+                else pd.NA
+            )
+            for identifier, column in IDENTITY_KEYS[scan_type].items()
+        },
+        index=scan_data.index,
+    )
+
+
+@profiled
+def resolve_identities(keys):
+    """
+    Links the records sharing any identifier into clusters, one per physical or virtual machine.
+    Records and identifier values are the nodes of a graph whose connected components are found
+    with a vectorized union-find: roots are hooked under the smallest root of every link, then
+    parents are replaced by their grandparents until every node points to its root.
+
+    Parameters:
+    - keys (dataframe): One column per identifier type, missing values and IGNORED_IDENTIFIERS never link records
+
+    Returns:
+    - (array): Cluster id of every record, numbered in order of first appearance
+    """
+
+    num_records = len(keys)
+    record_nodes, value_nodes = [], []
+    num_nodes = num_records
+
+    for identifier in keys.columns:
+        values = keys[identifier].astype("string[pyarrow]")
+        valid = ~(values.isna() | values.isin(IGNORED_IDENTIFIERS)).to_numpy(bool)
+        codes, uniques = pd.factorize(values[valid])
+        record_nodes.append(np.flatnonzero(valid))
+        value_nodes.append(codes + num_nodes)
+        num_nodes += len(uniques)
+
+    records = np.concatenate(record_nodes).astype(np.int64)
+    values = np.concatenate(value_nodes).astype(np.int64)
+    parent = np.arange(num_nodes)
+
+    while True:
+        record_roots, value_roots = parent[records], parent[values]
+        linked = record_roots != value_roots
+        if not linked.any():
+            break
+
+        # Hook the larger root of every link under the smaller one
+        np.minimum.at(
+            parent,
+            np.maximum(record_roots[linked], value_roots[linked]),
+            np.minimum(record_roots[linked], value_roots[linked]),
+        )
+
+        # Pointer jumping until every node points to its root
+        grandparent = parent[parent]
+        while (grandparent != parent).any():
+            parent = grandparent
+            grandparent = parent[parent]
+
+    return pd.factorize(parent[:num_records])[0]
+
+
+@profiled
+def mark_duplicate_clusters(deployment_df, cluster_ids):
+    """
+    Marks the duplicates in the deployment details from the identity clusters.
+    Every record of a cluster with more than one record is a duplicate. The machine is counted on the records
+    of a single source: the records of the first source considering it (e.g. the powered on VMs kept by the
+    vCenter rules) stay considered, or the first record not already excluded if no source considers it.
+
+    Parameters:
+    - deployment_df (dataframe): Combined deployment details, with their Source and Considered?(Y/N) columns
+    - cluster_ids (array): Cluster id of every record, see resolve_identities
+
+    Returns:
+    - (dataframe): Deployment details with the Cluster_ID column and the duplicates marked
+    """
+
+    deployment_df["Cluster_ID"] = cluster_ids
+    cluster = deployment_df["Cluster_ID"]
+
+    duplicates = cluster.groupby(cluster).transform("size") > 1
+    deployment_df["Duplicate?(Y/N)"] = duplicates.map({True: "Y", False: "N"})
+    deployment_df.loc[duplicates, "Comments"] = "Duplicate entries"
+
+    considered = deployment_df["Considered?(Y/N)"].astype(object)
+    deployment_df["Considered?(Y/N)"] = considered
+    candidates = considered != "N"
+    preferred = considered == "Y"
+    has_candidate = candidates.groupby(cluster).transform("any")
+    has_preferred = preferred.groupby(cluster).transform("any")
+
+    # The first record considered by its source, else the first record not already excluded
+    chosen = preferred | (candidates & ~has_preferred)
+    first_chosen = chosen & (chosen.groupby(cluster).cumsum() == 1)
+    source = deployment_df["Source"].astype(object)
+    kept_source = source.where(first_chosen).groupby(cluster).transform("first")
+    kept = first_chosen | (preferred & (source == kept_source))
+    deployment_df.loc[duplicates & has_candidate & ~kept, "Considered?(Y/N)"] = "N"
+
+    return deployment_df
@@ -0,0 +1,502 @@
+from pathlib import Path
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from .dates import REPORT_DATE_FORMAT
+from ..profiling import profiled
+
+# Columns derived by the pipeline for each scan type with their dtype, every other column is a raw fact
+INTERMEDIATE_SCHEMAS = {
+    "vcenter": {
+        "vm.dns_name_trimmed": "string",
+        "Considered": "category",
+        "Comment": "category",
+        "Same": "boolean",
+        "Duplicate": "category",
+        "Product Name": "category",
+        "Version": "category",
+    },
+    "network": {
+        "Comment": "category",
+        "Considered ?": "category",
+        "Creation Date / Install date": "datetime64[ns]",
+    },
+    "satellite": {
+        "hostname_trimmed": "string",
+        "install_date": "datetime64[ns]",
+        "Considered": "category",
+        "Comment": "category",
+        "phy_vir": "category",
+        "Duplicate": "category",
+    },
+}
+
+# How the date columns are rendered in the reports as (format, value for a missing date)
+INTERMEDIATE_DATE_FORMATS = {
+    "vcenter": {},
+    "network": {"Creation Date / Install date": (REPORT_DATE_FORMAT, None)},
+    "satellite": {"install_date": ("%Y-%m-%d", "-")},
+}
+
+
+def fill_missing_facts(df, fact_columns):
+    """
+    Renders the missing raw facts as "-" for the intermediate reports.
+    Columns derived by the pipeline and date columns keep their missing values as is.
+    Numeric facts with missing values are rendered as python objects to hold the "-" placeholder.
+
+    Parameters:
+    - df: pandas DataFrame to render
+    - fact_columns: Columns of the normalized facts dataframe
+
+    Returns:
+    A copy of the DataFrame with missing facts filled with "-"
+    """
+
+    columns = [
+        column
+        for column in fact_columns
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column])
+    ]
+
+    df = df.astype(
+        {
+            column: object
+            for column in columns
+            if not pd.api.types.is_string_dtype(df[column].dtype) and df[column].hasnans
+        }
+    )
+
+    return df.fillna(dict.fromkeys(columns, "-"))
+
+
+def intermediate_path(datadir: Path, scan_type, extension="parquet"):
+    """
+    Location of the intermediate data of a scan type
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan e.g. vcenter
+    - extension (string): parquet for the typed intermediate data, csv for the export
+
+    Returns:
+    - (Path): Intermediate file path
+    """
+
+    return (
+        Path(datadir)
+        / "intermediate"
+        / scan_type
+        / f"{scan_type}_intermediate_automated.{extension}"
+    )
+
+
+def intermediate_part_path(datadir: Path, scan_type, part):
+    """
+    Location of a batch of the intermediate data of a scan type, see combine_intermediate_parts
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - part (string): Name of the batch
+
+    Returns:
+    - (Path): Batch file path
+    """
+
+    return Path(datadir) / "intermediate" / scan_type / "parts" / f"{part}.parquet"
+
+
+def intermediate_fact_columns(df, scan_type):
+    """
+    Raw fact columns of the intermediate data i.e. the ones not derived by the pipeline
+
+    Parameters:
+    - df (dataframe): Intermediate data
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (list): Fact columns
+    """
+
+    return [
+        column for column in df.columns if column not in INTERMEDIATE_SCHEMAS[scan_type]
+    ]
+
+
+def apply_schema(df, scan_type):
+    """
+    Casts the intermediate data to the schema of its scan type.
+    Derived columns get their declared dtype, fact columns of mixed python values are stored as strings.
+
+    Parameters:
+    - df (dataframe): Intermediate data
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (dataframe): Typed intermediate data
+    """
+
+    schema = INTERMEDIATE_SCHEMAS[scan_type]
+    df = df.copy()
+
+    for column in df.columns:
+        if column in schema:
+            if schema[column].startswith("datetime64"):
+                df[column] = pd.to_datetime(df[column], errors="coerce")
+            df[column] = df[column].astype(schema[column])
+        elif df[column].dtype == object:
+            # Lists, dicts or values of different types can not be stored in a typed column
+            values = df[column]
+            df[column] = values.where(values.isna(), values.astype(str)).astype(
+                "string[pyarrow]"
+            )
+
+    return df
+
+
+def render_intermediate(df, scan_type):
+    """
+    Renders the intermediate data the way it is shown in the reports.
+    Missing facts are shown as "-" and dates in the report format of their column.
+
+    Parameters:
+    - df (dataframe): Intermediate data
+    - scan_type (string): Type of scan
+
+    Returns:
+    - (dataframe): Rendered copy of the intermediate data
+    """
+
+    # Categorical columns are rendered as plain strings, so the reports can hold any other value
+    df = df.astype(
+        {
+            column: "string[pyarrow]"
+            for column in df.columns
+            if isinstance(df[column].dtype, pd.CategoricalDtype)
+        }
+    )
+    df = fill_missing_facts(df, intermediate_fact_columns(df, scan_type))
+
+    for column, (date_format, missing) in INTERMEDIATE_DATE_FORMATS[scan_type].items():
+        if column in df.columns:
+            dates = pd.to_datetime(df[column], errors="coerce")
+            df[column] = dates.dt.strftime(date_format).astype(object)
+            if missing is not None:
+                df[column] = df[column].fillna(missing)
+
+    return df
+
+
+@profiled
+def write_intermediate(df, datadir: Path, scan_type, export_csv=False):
+    """
+    Writes the typed intermediate data of a scan type as Parquet
+
+    Parameters:
+    - df (dataframe): Intermediate data
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - export_csv (bool): Also export the rendered intermediate data as CSV
+    """
+
+    typed_df = apply_schema(df, scan_type)
+    typed_df.to_parquet(intermediate_path(datadir, scan_type))
+
+    if export_csv:
+        render_intermediate(typed_df, scan_type).to_csv(
+            intermediate_path(datadir, scan_type, "csv")
+        )
+
+
+@profiled
+def read_intermediate(datadir: Path, scan_type, columns=None, rendered=False):
+    """
+    Reads the typed intermediate data of a scan type, an empty dataframe is returned if it does not exist
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - columns (list): Columns to read, the ones not present are ignored. All columns are read when None
+    - rendered (bool): Render the data as in the reports, see render_intermediate
+
+    Returns:
+    - (dataframe): Intermediate data, with its rows numbered from 0
+    """
+
+    file_path = intermediate_path(datadir, scan_type)
+    if not os.path.exists(file_path):
+        return pd.DataFrame()
+
+    if columns is not None:
+        available = pq.read_schema(file_path).names
+        columns = [column for column in dict.fromkeys(columns) if column in available]
+
+    df = pd.read_parquet(file_path, columns=columns).reset_index(drop=True)
+
+    if rendered:
+        df = render_intermediate(df, scan_type)
+
+    return df
+
+
+@profiled
+def write_intermediate_part(df, datadir: Path, scan_type, part):
+    """
+    Writes a batch of the typed intermediate data of a scan type as Parquet, see combine_intermediate_parts
+
+    Parameters:
+    - df (dataframe): Batch of the intermediate data
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - part (string): Name of the batch
+
+    Returns:
+    - (Path): Batch file path
+    """
+
+    file_path = intermediate_part_path(datadir, scan_type, part)
+    os.makedirs(file_path.parent, exist_ok=True)
+    apply_schema(df, scan_type).to_parquet(file_path, index=False)
+
+    return file_path
+
+
+def unified_type(types):
+    """
+    Arrow type holding the values of a column written with different types by the batches of a scan
+
+    Parameters:
+    - types (list): Arrow types of the column in every batch
+
+    Returns:
+    - (DataType): Type of the column, strings when the batches disagree on anything but the width of the numbers
+    """
+
+    types = [data_type for data_type in dict.fromkeys(types) if data_type != pa.null()]
+
+    if not types:
+        return pa.null()
+    if len(types) == 1:
+        return types[0]
+    if all(pa.types.is_dictionary(data_type) for data_type in types):
+        values = unified_type([data_type.value_type for data_type in types])
+        return pa.dictionary(pa.int32(), values if values != pa.null() else pa.string())
+    if all(pa.types.is_integer(data_type) for data_type in types):
+        return pa.int64()
+    if all(
+        pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+        for data_type in types
+    ):
+        return pa.float64()
+
+    return pa.large_string()
+
+
+def unified_dtype(data_type, dtypes):
+    """
+    Pandas dtype of a column written with different dtypes by the batches of a scan
+
+    Parameters:
+    - data_type (DataType): Arrow type of the column, see unified_type
+    - dtypes (list): Pandas dtypes of the column in every batch
+
+    Returns:
+    - Dtype the column is read back with
+    """
+
+    dtypes = list(dict.fromkeys(str(dtype) for dtype in dtypes))
+
+    if len(dtypes) == 1:
+        return dtypes[0]
+    if pa.types.is_dictionary(data_type):
+        return "category"
+    if pa.types.is_integer(data_type):
+        return "Int64"
+    if pa.types.is_floating(data_type):
+        # Numbers with NaN for their missing values in some batch keep them as NaN
+        return "float64" if "float64" in dtypes or "int64" in dtypes else "Float64"
+    if pa.types.is_large_string(data_type):
+        return "string"
+
+    return object
+
+
+def unified_categories(part_paths, types):
+    """
+    Categories of the categorical columns of the batches of a scan, sorted as when the data is processed at once
+
+    Parameters:
+    - part_paths (list): Batches written by write_intermediate_part
+    - types (dict): Arrow type of every column, see unified_type
+
+    Returns:
+    - (dict): Arrow array of the categories of every categorical column
+    """
+
+    columns = [
+        column
+        for column, data_type in types.items()
+        if pa.types.is_dictionary(data_type)
+    ]
+    values = {column: set() for column in columns}
+    for part_path in part_paths:
+        schema = pq.read_schema(part_path)
+        # A column with only missing values in a batch is not categorical there
+        part_columns = [
+            column
+            for column in columns
+            if column in schema.names
+            and pa.types.is_dictionary(schema.field(column).type)
+        ]
+        part = pq.read_table(part_path, columns=part_columns)
+        for column in part_columns:
+            for chunk in part.column(column).chunks:
+                values[column].update(
+                    chunk.dictionary.cast(types[column].value_type).to_pylist()
+                )
+
+    return {
+        column: pa.array(
+            pd.Categorical(list(values[column])).categories,
+            type=types[column].value_type,
+        )
+        for column in columns
+    }
+
+
+def cast_column(values, data_type, categories=None):
+    """
+    Casts a column of a batch to the type of the column in the combined intermediate data
+
+    Parameters:
+    - values (ChunkedArray): Column of the batch
+    - data_type (DataType): Type of the column, see unified_type
+    - categories (Array): Categories of a categorical column, see unified_categories
+
+    Returns:
+    - (Array): Column of the combined data, a categorical one sharing the categories of every batch
+    """
+
+    if categories is None:
+        return values.cast(data_type)
+
+    decoded = values.cast(data_type.value_type).combine_chunks()
+    return pa.DictionaryArray.from_arrays(
+        pc.index_in(decoded, value_set=categories).cast(data_type.index_type),
+        categories,
+    )
+
+
+@profiled
+def combine_intermediate_parts(
+    part_paths, datadir: Path, scan_type, fact_columns, export_csv=False
+):
+    """
+    Combines the batches of the intermediate data of a scan type into its Parquet file, one batch at a time.
+    The batches may miss some columns or hold them with different types, every batch is cast to a common schema.
+    Only the facts reported by some batch and the columns derived by the pipeline are kept, in the order of the
+    data processed at once, and the categorical columns share the categories of the data processed at once.
+    The batches are removed once combined.
+
+    Parameters:
+    - part_paths (list): Batches written by write_intermediate_part, in row order
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - fact_columns (list): Raw fact columns reported by the batches, in order of first appearance
+    - export_csv (bool): Also export the rendered intermediate data as CSV
+    """
+
+    schemas = [pq.read_schema(part_path) for part_path in part_paths]
+    present = {name for schema in schemas for name in schema.names}
+    columns = list(fact_columns) + [
+        column for column in INTERMEDIATE_SCHEMAS[scan_type] if column in present
+    ]
+
+    part_dtypes = [schema.empty_table().to_pandas().dtypes for schema in schemas]
+    types, dtypes = {}, {}
+    for column in columns:
+        parts = [
+            number for number, schema in enumerate(schemas) if column in schema.names
+        ]
+        types[column] = unified_type(
+            [schemas[number].field(column).type for number in parts]
+        )
+        dtypes[column] = unified_dtype(
+            types[column], [part_dtypes[number][column] for number in parts]
+        )
+
+    # The pandas metadata of the schema gives the columns their dtype when read back
+    schema = pa.schema([pa.field(column, types[column]) for column in columns])
+    metadata_df = schema.empty_table().to_pandas().astype(dtypes)
+    schema = schema.with_metadata(
+        pa.Table.from_pandas(
+            metadata_df, schema=schema, preserve_index=False
+        ).schema.metadata
+    )
+
+    categories = unified_categories(part_paths, types)
+    csv_path = intermediate_path(datadir, scan_type, "csv")
+    rows = 0
+    with pq.ParquetWriter(intermediate_path(datadir, scan_type), schema) as writer:
+        for part_path in part_paths:
+            part = pq.read_table(part_path)
+            table = pa.Table.from_arrays(
+                [
+                    (
+                        cast_column(
+                            part.column(column),
+                            types[column],
+                            categories.get(column),
+                        )
+                        if column in part.column_names
+                        else pa.nulls(len(part), types[column])
+                    )
+                    for column in columns
+                ],
+                schema=schema,
+            )
+            writer.write_table(table)
+
+            if export_csv:
+                rendered = render_intermediate(table.to_pandas(), scan_type)
+                rendered.index = pd.RangeIndex(rows, rows + len(rendered))
+                rendered.to_csv(csv_path, mode="a" if rows else "w", header=not rows)
+            rows += len(table)
+
+    if part_paths:
+        shutil.rmtree(Path(part_paths[0]).parent)
+
+
+def iter_intermediate_batches(
+    datadir: Path, scan_type, batch_size, columns=None, rendered=False
+):
+    """
+    Reads the typed intermediate data of a scan type in batches, nothing is read if it does not exist
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - batch_size (int): Maximum number of rows of a batch
+    - columns (list): Columns to read, the ones not present are ignored. All columns are read when None
+    - rendered (bool): Render the data as in the reports, see render_intermediate
+
+    Returns:
+    - generator: Batch of the intermediate data, with its rows numbered from 0
+    """
+
+    file_path = intermediate_path(datadir, scan_type)
+    if not os.path.exists(file_path):
+        return
+
+    parquet_file = pq.ParquetFile(file_path)
+    if columns is not None:
+        available = parquet_file.schema_arrow.names
+        columns = [column for column in dict.fromkeys(columns) if column in available]
+
+    for batch in parquet_file.iter_batches(batch_size, columns=columns):
+        df = batch.to_pandas().reset_index(drop=True)
+        yield render_intermediate(df, scan_type) if rendered else df
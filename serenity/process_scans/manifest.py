@@ -0,0 +1,160 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+from .hostname_index import hostname_index_path
+from .intermediate import intermediate_path
+
+# Raw files read by the scan stages, see pre_process.read_raw_input
+RAW_FILE_NAMES = ("details.json", "deployments.json")
+
+# Source code of the package, any change to it invalidates every stage
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+
+def manifest_path(datadir: Path):
+    """
+    Location of the manifest of a recon
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+
+    Returns:
+    - (Path): Manifest file path
+    """
+
+    return Path(datadir) / "intermediate" / "manifest.json"
+
+
+def load_manifest(datadir: Path):
+    """
+    Loads the manifest written by the previous run of a recon
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+
+    Returns:
+    - (dict): Manifest entry of every stage, empty if the recon was never processed
+    """
+
+    file_path = manifest_path(datadir)
+    if not os.path.exists(file_path):
+        return {}
+
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(datadir: Path, manifest):
+    """
+    Saves the manifest of a recon
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - manifest (dict): Manifest entry of every stage
+    """
+
+    with open(manifest_path(datadir), "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+
+def hash_file(file_path):
+    """
+    Hashes the content of a file
+
+    Parameters:
+    - file_path (Path): File to hash
+
+    Returns:
+    - (string): SHA-256 hex digest of the file content
+    """
+
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def hash_raw_files(raw_path: Path):
+    """
+    Hashes the raw files of a scan type
+
+    Parameters:
+    - raw_path (Path): Folder location of the raw datasets of the scan type
+
+    Returns:
+    - (dict): Content hash of every raw file, by path relative to raw_path
+    """
+
+    raw_hashes = {}
+    for root, dirs, files in os.walk(raw_path):
+        for file_name in RAW_FILE_NAMES:
+            if file_name in files:
+                file_path = os.path.join(root, file_name)
+                raw_hashes[os.path.relpath(file_path, raw_path)] = hash_file(file_path)
+
+    return dict(sorted(raw_hashes.items()))
+
+
+def code_version():
+    """
+    Hashes the source code of the package, covering the processing code and its rulesets
+
+    Returns:
+    - (string): SHA-256 hex digest of all the python files of the package
+    """
+
+    digest = hashlib.sha256()
+    for file_path in sorted(PACKAGE_DIR.rglob("*.py")):
+        digest.update(str(file_path.relative_to(PACKAGE_DIR)).encode())
+        digest.update(hash_file(file_path).encode())
+
+    return digest.hexdigest()
+
+
+def stage_entry(datadir: Path, scan_type, options):
+    """
+    Builds the manifest entry describing the inputs of a scan stage
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - options (dict): Settings the stage output depends on, including the fingerprint of the upstream stages
+
+    Returns:
+    - (dict): Raw file hashes, code version, options and their combined fingerprint
+    """
+
+    entry = {
+        "raw_files": hash_raw_files(Path(datadir) / "raw" / scan_type),
+        "code_version": code_version(),
+        "options": options,
+    }
+    entry["fingerprint"] = hashlib.sha256(
+        json.dumps(entry, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+    return entry
+
+
+def is_stage_current(manifest, datadir: Path, scan_type, entry):
+    """
+    Checks if a stage can reuse its stored intermediate data
+
+    Parameters:
+    - manifest (dict): Manifest of the previous run
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - entry (dict): Manifest entry of the stage for this run, see stage_entry
+
+    Returns:
+    - (bool): True if the stage inputs did not change and its intermediate data is still there,
+      along with the hostname index for the vcenter stage
+    """
+
+    previous = manifest.get(scan_type, {})
+    outputs = [intermediate_path(datadir, scan_type)]
+    if scan_type == "vcenter":
+        outputs.append(hostname_index_path(datadir))
+
+    return previous.get("fingerprint") == entry["fingerprint"] and all(
+        os.path.exists(output) for output in outputs
+    )
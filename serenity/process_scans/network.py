@@ -1,110 +1,139 @@
 import pandas as pd
 import warnings
+from .dates import parse_dates
+from .hostname_index import in_vcenter
+from .pre_process import compact_frame, flatten_facts, flatten_fingerprints
+from ..profiling import profiled
 
 warnings.filterwarnings("ignore")
 
 
-def prep_network_data(network_data, network_deployment_data):
+@profiled
+def prep_network_data(
+    network_data, network_deployment_data, fact_keys=None, target_string=None
+):
     """
     Gets the Network  details and deployment data in a column format from the nested json
 
     Parameters:
-    - network_data (dataframe): raw Network data
+    - network_data (list): raw Network details reports
+    - network_deployment_data (list): raw Network deployments reports
+    - fact_keys (list): Fact keys consumed by the Network scan, all facts are kept when None
+    - target_string (string): Error message whose facts are kept even if not in fact_keys
 
     Returns:
-    - (dataframe): Normalized Network data
+    - (dataframe), (dataframe): Normalized Network details and deployment data
     """
     # Network Details Data
-    df_norm_n_details = pd.json_normalize(network_data["sources"])
-    df_norm_n_details_facts = pd.json_normalize(df_norm_n_details["facts"])
-    df_norm_n_details_facts_det = pd.DataFrame()
-    # Detect all dictionaries that have facts data.
-    for i in range(len(df_norm_n_details_facts.columns.to_list())):
-        df_norm_n_details_facts_det = pd.concat(
-            [
-                df_norm_n_details_facts_det,
-                pd.json_normalize(df_norm_n_details_facts[i]),
-            ],
-            ignore_index=True,
-        )
-
-    final_details_df = df_norm_n_details_facts_det.fillna("-")
+    final_details_df = compact_frame(
+        flatten_facts(network_data, fact_keys, target_string)
+    )
 
     # Network Deployment Data
-    df_norm_system_fingerprints = pd.json_normalize(
-        network_deployment_data["system_fingerprints"]
-    )
-    df_norm_n_deployment = df_norm_system_fingerprints.fillna("-")
+    df_norm_n_deployment = compact_frame(flatten_fingerprints(network_deployment_data))
 
     return final_details_df, df_norm_n_deployment
 
 
-def check_for_errors(final_details_df, target_string):
+@profiled
+def find_error_lines(final_details_df, target_string):
+    """
+    Looks for the target_string that is the error message in every text column of the DataFrame at once.
+    Each column is scanned with a single vectorized substring search instead of visiting every cell.
+
+    Parameters:
+    - final_details_df: pandas DataFrame containing host details
+    - target_string: Error message to look for e.g. "Could not"
+
+    Returns:
+    A boolean Series, True for the rows where the target string is found in any cell
+    """
+
+    error_lines = pd.Series(False, index=final_details_df.index)
+
+    for column in final_details_df.columns.drop(
+        ["Comment", "Considered ?"], errors="ignore"
+    ):
+        values = final_details_df[column]
+
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Categorical columns are searched once per distinct value
+            error_lines |= values.str.contains(
+                target_string, regex=False, na=False
+            ).astype(bool)
+        elif pd.api.types.is_string_dtype(values.dtype):
+            if values.dtype == object:
+                # Mixed columns (lists, dicts, numbers) are searched on their string representation
+                values = values.astype(str)
+            error_lines |= values.str.contains(
+                target_string, regex=False, na=False
+            ).astype(bool)
+
+    return error_lines
+
+
+@profiled
+def check_for_errors(final_details_df, target_string, error_lines=None):
     """
     This function looks for the target_string that is the error message within each cell of the DataFrame
     and update two additional columns, "Comment" and "Considered ?", based on whether the target string is found in each cell.
 
     Parameters: Takes a pandas DataFrame final_details_df and a target string target_string as input.
+    The error lines already found by find_error_lines can be passed as error_lines to skip the scan.
 
     Returns: Modified Dataframe with the comment and considered value.
     """
+    if error_lines is None:
+        error_lines = find_error_lines(final_details_df, target_string)
+
     # Add a new column named "Comment" with default values
     final_details_df["Comment"] = ""
     # Add a new column named "Considered ?" with default values
     final_details_df["Considered ?"] = ""
 
-    # Iterate through each row and column of the DataFrame
-    for row_idx, row in final_details_df.iterrows():
-        for col in final_details_df.columns:
-            cell_value = str(row[col])
-
-            # Check if the target string exists in the cell value
-            if target_string in cell_value:
-                # Update the "comment" column to "Error Line"
-                final_details_df.at[row_idx, "Comment"] = "Error Line"
-                final_details_df.at[row_idx, "Considered ?"] = "N"
-                break  # Break the inner loop to move to the next row
+    # Update the "comment" column to "Error Line" for the rows having the target string
+    final_details_df.loc[error_lines, "Comment"] = "Error Line"
+    final_details_df.loc[error_lines, "Considered ?"] = "N"
 
     # Display the modified DataFrame
     return final_details_df
 
 
-def new_host_names(final_details_df, vcenter_intermediate):
+@profiled
+def new_host_names(final_details_df, vcenter_intermediate, error_lines=None):
     """
     Process host names and update DataFrame with "Comment" and "Considered ?" columns.
 
     Parameters:
     - final_details_df: pandas DataFrame containing host details
-    - vcenter_intermediate: pandas DataFrame with intermediate data
+    - vcenter_intermediate: vCenter hostname index (see hostname_index) or pandas DataFrame with intermediate data
+    - error_lines: Rows with error messages as found by find_error_lines, scanned again if not given
 
     Returns:
     Updated DataFrame with new columns "Comment" and "Considered ?"
     """
 
     # Extract the hostname part from 'uname_hostname' column
-    final_details_df["uname_hostname"] = final_details_df["uname_hostname"].apply(
-        lambda x: x.split(".", 1)[0]
+    final_details_df["uname_hostname"] = (
+        final_details_df["uname_hostname"]
+        .fillna("-")
+        .apply(lambda x: x.split(".", 1)[0])
     )
 
-    # Check if the hostname is in 'vm.dns_name_trimmed' column of vcenter_intermediate
-    final_details_df["Considered ?"] = (
-        final_details_df["uname_hostname"]
-        .isin(vcenter_intermediate["vm.dns_name_trimmed"])
-        .map({True: "N", False: "Y"})
+    # Check if the hostname is a VM reported in vcenter
+    in_vcenter_hosts = in_vcenter(
+        final_details_df["uname_hostname"], vcenter_intermediate
     )
+    final_details_df["Considered ?"] = in_vcenter_hosts.map({True: "N", False: "Y"})
 
     # Create a mapping for the "Comment" column values
-    comment_mapping = (
-        final_details_df["uname_hostname"]
-        .isin(vcenter_intermediate["vm.dns_name_trimmed"])
-        .map({True: "Already Considered in Vcenter"})
-    )
+    comment_mapping = in_vcenter_hosts.map({True: "Already Considered in Vcenter"})
 
     # Define the target string for error detection
     target_string = "Could not"
 
     # Call the error detection function with the target string
-    check_for_errors(final_details_df, target_string)
+    check_for_errors(final_details_df, target_string, error_lines)
 
     # Add the "Comment" column to the DataFrame based on the mapping
     final_details_df["Comment"] = comment_mapping
@@ -112,6 +141,7 @@ def new_host_names(final_details_df, vcenter_intermediate):
     return final_details_df
 
 
+@profiled
 def add_date_column(final_details_df, df_n_deployment):
     """
     Add a 'Creation Date / Install date' column to final_details_df.
@@ -121,7 +151,7 @@ def add_date_column(final_details_df, df_n_deployment):
     - df_n_deployment: pandas DataFrame with deployment data
 
     Returns:
-    Updated final_details_df with the 'Creation Date / Install date' column.
+    Updated final_details_df with the 'Creation Date / Install date' column as datetime.
     """
 
     # Define the prefix to search for
@@ -132,27 +162,16 @@ def add_date_column(final_details_df, df_n_deployment):
         column for column in final_details_df.columns if column.startswith(prefix)
     ]
 
-    # Convert columns with date values to datetime type
+    # Convert columns with date values to datetime type, one call per column
     for column in values_with_date:
-        final_details_df[column] = final_details_df[column].apply(
-            pd.to_datetime, errors="coerce"
-        )
+        final_details_df[column] = parse_dates(final_details_df[column])
 
     # Calculate the minimum date across specified columns
-    final_details_df["Creation Date / Install date"] = final_details_df[
-        values_with_date
-    ].min(axis=1)
-
-    # Convert the 'Creation Date / Install date' column to datetime format
+    # It stays a datetime and is only rendered in MM/DD/YYYY format when the report is written
     final_details_df["Creation Date / Install date"] = pd.to_datetime(
-        final_details_df["Creation Date / Install date"]
+        final_details_df[values_with_date].min(axis=1)
     )
 
-    # Format the 'Creation Date / Install date' column in MM/DD/YYYY format
-    final_details_df["Creation Date / Install date"] = final_details_df[
-        "Creation Date / Install date"
-    ].dt.strftime("%-m/%-d/%-Y")
-
     # Merge the deployments and details based on the common host name columns
     merged_df = pd.merge(
         df_n_deployment,
@@ -162,17 +181,15 @@ def add_date_column(final_details_df, df_n_deployment):
         how="inner",
     )
 
-    # Convert 'system_creation_date' to datetime format and reformat it
+    # Convert 'system_creation_date' to datetime format
     merged_df["system_creation_date"] = pd.to_datetime(
         merged_df["system_creation_date"], format="%Y-%m-%d"
     )
-    merged_df["system_creation_date"] = merged_df["system_creation_date"].dt.strftime(
-        "%-m/%-d/%-Y"
-    )
 
-    # Check if the corresponding time columns match
+    # Check if the corresponding dates match
     merged_df["time_match"] = (
-        merged_df["system_creation_date"] == merged_df["Creation Date / Install date"]
+        merged_df["system_creation_date"].dt.normalize()
+        == merged_df["Creation Date / Install date"].dt.normalize()
     )
 
     # Print the merged DataFrame with the time match flag
@@ -182,6 +199,7 @@ def add_date_column(final_details_df, df_n_deployment):
     return final_details_df
 
 
+@profiled
 def check_num_of_packages(final_details_df):
     """
     Check the 'redhat_packages_gpg_num_rh_packages' column and mark duplicates in the DataFrame.
@@ -200,9 +218,9 @@ def check_num_of_packages(final_details_df):
     # Check if values in "redhat_packages_gpg_num_installed_packages" column are within the range of 0 to 10
     if final_details_df["redhat_packages_gpg_num_rh_packages"].between(0, 10).all():
         duplicates = final_details_df.duplicated(subset=["uname_hostname"], keep=False)
-        final_details_df.loc[
-            duplicates, "Considered ?"
-        ] = True  # Mark duplicates as True in the "Considered ?" column
+        final_details_df.loc[duplicates, "Considered ?"] = (
+            True  # Mark duplicates as True in the "Considered ?" column
+        )
 
         if duplicates.any():
             duplicated_names = final_details_df.loc[
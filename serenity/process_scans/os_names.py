@@ -0,0 +1,115 @@
+from pathlib import Path
+import json
+import os
+import re
+import pandas as pd
+
+# Generic "<product> <version>" split, the version starting at the first digit or parenthesis
+GENERIC_OS_PATTERN = re.compile(r"^(.*?)\s*(\(.*\)|\d.*)?$")
+WINDOWS_XP_PATTERN = re.compile(r"(Microsoft Windows).*?(XP.*)")
+OTHER_OS_PATTERN = re.compile(r"Other(.*)")
+
+# Parsed (Product Name, Version) of every distinct OS string seen so far, shared by all scan types
+OS_NAME_CACHE = {}
+
+
+def parse_os_name(os_name):
+    """
+    Splits a single OS string into its product name and version
+
+    Parameters:
+    - os_name (string): OS string as reported by the scan e.g. "Red Hat Enterprise Linux 8 (64-bit)"
+
+    Returns:
+    - (tuple): Product name and version, the version is "-" when the OS string has none.
+      A value that is not a string has no product name, as a missing OS string
+    """
+
+    if not isinstance(os_name, str):
+        return None, "-"
+
+    if os_name.startswith("Other"):
+        product, version = "Other", OTHER_OS_PATTERN.search(os_name).group(1)
+    elif "Microsoft Windows XP" in os_name:
+        product, version = WINDOWS_XP_PATTERN.search(os_name).groups()
+    else:
+        match = GENERIC_OS_PATTERN.search(os_name)
+        product, version = match.groups() if match else (None, None)
+
+    product = product.strip() if product is not None else None
+    version = version.strip() if version is not None else "-"
+
+    return product, version
+
+
+def lookup_os_name(os_name):
+    """
+    Gets the product name and version of an OS string, parsing it only the first time it is seen
+
+    Parameters:
+    - os_name (string): OS string as reported by the scan
+
+    Returns:
+    - (tuple): Product name and version
+    """
+
+    # Only OS strings are cached, the keys of the saved cache being strings, see save_os_cache
+    if not isinstance(os_name, str):
+        return parse_os_name(os_name)
+    if os_name not in OS_NAME_CACHE:
+        OS_NAME_CACHE[os_name] = parse_os_name(os_name)
+
+    return OS_NAME_CACHE[os_name]
+
+
+def split_os_names(os_names):
+    """
+    Splits an OS column into product name and version.
+    Each distinct OS string is parsed once and the results are broadcast back to the rows.
+
+    Parameters:
+    - os_names (Series): OS strings, missing values are allowed
+
+    Returns:
+    - (Series), (Series): Product name and version, aligned with os_names. Rows without an OS string
+      have a missing product name and "-" as version
+    """
+
+    codes, uniques = pd.factorize(os_names)
+    parsed = [lookup_os_name(os_name) for os_name in uniques]
+
+    # Extra last entry for the missing values (code -1)
+    products = pd.array([product for product, _ in parsed] + [None], dtype="string")
+    versions = pd.array([version for _, version in parsed] + ["-"], dtype="string")
+
+    product_names = pd.Series(products.take(codes), index=os_names.index)
+    versions = pd.Series(versions.take(codes), index=os_names.index)
+
+    return product_names, versions
+
+
+def load_os_cache(file_path: Path):
+    """
+    Loads OS strings parsed in previous runs into the cache
+
+    Parameters:
+    - file_path (Path): JSON file written by save_os_cache, nothing is loaded if it does not exist
+    """
+
+    if os.path.exists(file_path):
+        with open(file_path, "r") as f:
+            OS_NAME_CACHE.update(
+                (os_name, tuple(parsed)) for os_name, parsed in json.load(f).items()
+            )
+
+
+def save_os_cache(file_path: Path):
+    """
+    Saves the parsed OS strings so later runs do not need to parse them again
+
+    Parameters:
+    - file_path (Path): JSON file to write the cache to
+    """
+
+    with open(file_path, "w") as f:
+        json.dump(OS_NAME_CACHE, f, indent=4)
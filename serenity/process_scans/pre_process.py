@@ -2,91 +2,263 @@ from pathlib import Path
 import os
 import json
 import pandas as pd
-import numpy as np
-from .v_center import compare_dfs
+from .intermediate import read_intermediate
+from .validation import validate_columns
+from ..profiling import profiled
 
+# Row number of the automated intermediate data, usable as a validation key (see inputs.py)
+ROW_NUMBER_COLUMN = "row_number"
 
-def read_raw_input(file_path: Path):
+
+def iter_raw_input(file_path: Path, file_name):
     """
-    Reads the raw input JSON (deployments, details) files and appends (if multiple JSON files are present)
-    into a single input JSON file
+    Walks the raw input folder and yields the parsed contents of every JSON file with the given name,
+    one report at a time
 
     Parameters:
     - file_path (Path): File path location of the raw datasets
+    - file_name (string): Name of the raw JSON file to look for, e.g. details.json
 
     Returns:
-    - JSON file: A new JSON file for deployments and details respectively in the file path
+    - generator: Parsed JSON report for each matching file found under the file path
     """
 
-    merged_deployments_data = []
-    merged_details_data = []
     for root, dirs, files in os.walk(file_path):
-        for file in files:
-            # Check if the file is a deployments.json file
-            if file == "deployments.json":
-                # Read the deployments.json file data
-                with open(os.path.join(root, file), "r") as f:
-                    deployments_data = json.load(f)
+        if file_name in files:
+            with open(os.path.join(root, file_name), "r") as f:
+                yield json.load(f)
+
+
+@profiled
+def read_raw_input(file_path: Path, write_merged=False):
+    """
+    Reads the raw input JSON (deployments, details) files and appends (if multiple JSON files are present)
+    into a single list of reports that can be handed straight to the normalization step
+
+    Parameters:
+    - file_path (Path): File path location of the raw datasets
+    - write_merged (bool): Also write the merged reports to merged_details.json and
+      merged_deployments.json in the file path
+
+    Returns:
+    - list, list: Merged details and deployments reports respectively
+    """
+
+    merged_details_data = list(iter_raw_input(file_path, "details.json"))
+    merged_deployments_data = list(iter_raw_input(file_path, "deployments.json"))
+
+    if write_merged:
+        # Write the merged JSON data to two new files
+        with open(os.path.join(file_path, "merged_deployments.json"), "w") as f:
+            json.dump(merged_deployments_data, f)
+
+        with open(os.path.join(file_path, "merged_details.json"), "w") as f:
+            json.dump(merged_details_data, f)
+
+    return merged_details_data, merged_deployments_data
+
+
+def iter_facts(reports):
+    """
+    Walks sources[*].facts[*] of every report once, yielding the raw facts dictionary of each host
+
+    Parameters:
+    - reports (list): Merged raw details reports
+
+    Returns:
+    - generator: Facts dictionary for each host, in report order
+    """
+
+    for report in reports:
+        for source in report.get("sources") or []:
+            yield from source.get("facts") or []
+
+
+def iter_fact_batches(file_path: Path, batch_size):
+    """
+    Walks the raw details reports one at a time and yields the facts of their hosts in batches.
+    The hosts are released from their report once batched, so at most one report and one batch are held.
+
+    Parameters:
+    - file_path (Path): File path location of the raw datasets
+    - batch_size (int): Maximum number of hosts of a batch
+
+    Returns:
+    - generator: List of the facts dictionaries of at most batch_size hosts, in report order
+    """
+
+    batch = []
+    for report in iter_raw_input(file_path, "details.json"):
+        for source in report.get("sources") or []:
+            facts = source.get("facts") or []
+            # Hosts are popped from the end, so the list is reversed first to keep the report order
+            facts.reverse()
+            while facts:
+                batch.append(facts.pop())
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+
+    if batch:
+        yield batch
+
+
+def fact_key_filter(fact_keys):
+    """
+    Builds a predicate telling whether a raw fact key is needed by the pipeline.
+    Keys ending with "*" select every fact starting with that prefix e.g. "vm.host.*", and the parent of
+    a dotted key is kept as well so nested facts are still flattened into the requested columns.
+
+    Parameters:
+    - fact_keys (list): Fact keys consumed by a scan type
+
+    Returns:
+    - function: Predicate taking a fact key and returning True if it should be kept
+    """
+
+    exact = {key for key in fact_keys if not key.endswith("*")}
+    prefixes = tuple(key[:-1] for key in fact_keys if key.endswith("*"))
+    parents = {
+        key.rsplit(".", i)[0] for key in fact_keys for i in range(1, key.count(".") + 1)
+    }
+
+    return lambda key: key in exact or key in parents or key.startswith(prefixes)
 
-                # Append the deployments.json file data to the merged deployments data list
-                merged_deployments_data.append(deployments_data)
 
-            # Check if the file is a details.json file
-            elif file == "details.json":
-                # Read the details.json file data
-                with open(os.path.join(root, file), "r") as f:
-                    details_data = json.load(f)
+@profiled
+def flatten_facts(reports, fact_keys=None, retain_text=None):
+    """
+    Flattens the facts of all the reports into a single details dataframe, built in one allocation
+
+    Parameters:
+    - reports (list): Merged raw details reports
+    - fact_keys (list): Fact keys to keep (see fact_key_filter), all facts are kept when None
+    - retain_text (string): Also keep any other fact whose value contains this text, so error lines
+      are still visible to check_for_errors
+
+    Returns:
+    - (dataframe): One row per host with a column per (nested) fact
+    """
 
-                # Append the details.json file data to the merged details data list
-                merged_details_data.append(details_data)
+    if fact_keys is None:
+        return pd.json_normalize(list(iter_facts(reports)))
 
-    # Write the merged JSON data to two new files
-    with open(os.path.join(file_path, "merged_deployments.json"), "w") as f:
-        json.dump(merged_deployments_data, f, indent=4)
+    wanted = fact_key_filter(fact_keys)
+    projected_facts = [
+        {
+            key: value
+            for key, value in facts.items()
+            if wanted(key) or (retain_text is not None and retain_text in str(value))
+        }
+        for facts in iter_facts(reports)
+    ]
 
-    with open(os.path.join(file_path, "merged_details.json"), "w") as f:
-        json.dump(merged_details_data, f, indent=4)
+    return pd.json_normalize(projected_facts)
 
 
-def normalize_data(df_details, df_deployments):
+@profiled
+def flatten_fingerprints(reports):
+    """
+    Flattens the system fingerprints of all the deployments reports into a single dataframe
+
+    Parameters:
+    - reports (list): Merged raw deployments reports
+
+    Returns:
+    - (dataframe): One row per system fingerprint
+    """
+
+    return pd.json_normalize(
+        [
+            fingerprint
+            for report in reports
+            for fingerprint in report.get("system_fingerprints") or []
+        ]
+    )
+
+
+@profiled
+def compact_frame(df):
+    """
+    Stores the string columns of a wide facts dataframe as Arrow-backed strings.
+    Missing facts stay as real nulls (a validity bitmap) instead of a dense column of "-" strings.
+
+    Parameters:
+    - df: pandas DataFrame with object columns
+
+    Returns:
+    The same DataFrame with string-only (or entirely missing) columns converted to string[pyarrow]
+    """
+
+    string_columns = [
+        column
+        for column in df.columns[df.dtypes == object]
+        if pd.api.types.infer_dtype(df[column], skipna=True) in ("string", "empty")
+    ]
+
+    return df.astype(dict.fromkeys(string_columns, "string[pyarrow]"))
+
+
+def is_missing(series):
+    """
+    Checks which values of a column are missing, either a real null or the "-" placeholder
+
+    Parameters:
+    - series: pandas Series
+
+    Returns:
+    A boolean Series, True where the value is missing
+    """
+
+    return (series.isna() | (series == "-")).astype(bool)
+
+
+@profiled
+def normalize_data(details_reports, deployments_reports, fact_keys=None):
     """
     Normalize the details.json, deployments.json file contents
 
     Parameters:
-    - df_details (dataframe): Dataframe wih the details.json contents
-    - df_deployments (dataframe): Dataframe with the deployments.json contents
+    - details_reports (list): Merged details.json reports
+    - deployments_reports (list): Merged deployments.json reports
+    - fact_keys (list): Fact keys consumed by the scan type, all facts are kept when None
 
     Returns:
     - details dataframe: New dataframe with normalized columns
     - deployments dataframe: New dataframe with normalized columns
+
+    Missing facts are kept as nulls, they are only rendered as "-" when the intermediate data is written.
     """
 
-    df_norm_details = pd.json_normalize(df_details["sources"])
+    final_details_df = compact_frame(flatten_facts(details_reports, fact_keys))
 
-    # extra step needs to be done if there are multiple raw json files
-    df_norm_details = pd.json_normalize(df_norm_details[0])
+    # Deployment data
+    df_norm_deployment = compact_frame(flatten_fingerprints(deployments_reports))
 
-    df_norm_details_facts = pd.json_normalize(df_norm_details["facts"])
-    df_norm_details_facts_det = pd.DataFrame()
+    return final_details_df, df_norm_deployment
 
-    # Detect all dictionaries that have facts data.
-    for i in range(len(df_norm_details_facts.columns.to_list())):
-        df_norm_details_facts_det = pd.concat(
-            [df_norm_details_facts_det, pd.json_normalize(df_norm_details_facts[i])],
-            ignore_index=True,
-        )
 
-    final_details_df = df_norm_details_facts_det.fillna("-")
+@profiled
+def empty_value_mask(df):
+    """
+    Builds a boolean mask of the cells that are considered empty i.e. "-", "N", NaN or NaT.
+    The mask is built column by column with vectorized comparisons instead of a Python callback per row.
 
-    # Deployment data
-    df_norm_system_fingerprints = pd.json_normalize(
-        df_deployments["system_fingerprints"]
-    )
-    df_norm_deployment = df_norm_system_fingerprints.fillna("-")
+    Parameters:
+    - df: pandas DataFrame
 
-    return final_details_df, df_norm_deployment
+    Returns:
+    A boolean DataFrame of the same shape as df, True where the cell is empty.
+    """
+
+    mask = df.isna()
+    for value in ("-", "N"):
+        mask |= df == value
 
+    return mask
 
+
+@profiled
 def drop_empty_rows_columns(df, r_or_c):
     """
     Get the dataframe where empty rows/columns need to be dropped.
@@ -99,54 +271,34 @@ def drop_empty_rows_columns(df, r_or_c):
     A modified DataFrame with empty rows or columns removed.
     """
 
-    value = np.float64(np.nan)
+    if r_or_c not in ("rows", "columns"):
+        raise ValueError("Invalid value for 'r_or_c'. Use 'rows' or 'columns'.")
+
+    empty = empty_value_mask(df).to_numpy(dtype=bool)
 
     if r_or_c == "rows":
-        # Find rows with only empty values across all columns
-        rows_to_drop = df.index[
-            df.apply(
-                lambda row: np.all(
-                    (row == "-")
-                    | (row == "N")
-                    | (row == value)
-                    | pd.isna(row)
-                    | pd.isnull(row)
-                    | (row is pd.NaT)
-                ),
-                axis=1,
-            )
-        ].tolist()
-
-        # Drop the identified rows
-        df = df.drop(index=rows_to_drop)
-        df.reset_index(inplace=True, drop=True)
-
-    elif r_or_c == "columns":
-        # Find columns with only empty values across all rows
-        columns_to_drop = df.columns[
-            df.apply(
-                lambda col: np.all(
-                    (col == "-")
-                    | (col == "N")
-                    | (col == value)
-                    | pd.isna(col)
-                    | pd.isnull(col)
-                    | (col is pd.NaT)
-                )
-            )
-        ].tolist()
-
-        # Drop the identified columns
-        df = df.drop(columns=columns_to_drop)
-        df.reset_index(inplace=True, drop=True)
+        # Keep rows with at least one non empty value across all columns
+        df = df[~empty.all(axis=1)]
 
     else:
-        raise ValueError("Invalid value for 'r_or_c'. Use 'rows' or 'columns'.")
+        # Keep columns with at least one non empty value across all rows
+        df = df.loc[:, ~empty.all(axis=0)]
+
+    df = df.reset_index(drop=True)
 
     return df
 
 
-def process_scans(file_path: Path, scan_type, gbd_keys, auto_keys, gbd_cols, auto_cols):
+@profiled
+def process_scans(
+    file_path: Path,
+    scan_type,
+    gbd_keys,
+    auto_keys,
+    gbd_cols,
+    auto_cols,
+    export_csv=False,
+):
     """
     Comparison of GBD generated vs automated intermediate data when running in
     validation mode.
@@ -157,24 +309,29 @@ def process_scans(file_path: Path, scan_type, gbd_keys, auto_keys, gbd_cols, aut
     - gbd_keys: Unique columns from the GBD dataset to reorder the rows in the data
     - auto_keys: Unique columns from the automated dataset to reorder the rows in the data
     - comparison_on: Columns to compare
+    - export_csv: Also write the mismatched values as CSV
 
     Returns:
     The accuracy results (in percentage) for columns specified
     """
 
     print(f"In validation mode and checking for accuracy for {scan_type} scans.")
+    # Both datasets are compared as rendered in the reports, with missing values as empty strings
     gbd_df = pd.read_csv(
         file_path
         / "intermediate"
         / scan_type
-        / f"{scan_type}_intermediate_gbd_generated.csv"
+        / f"{scan_type}_intermediate_gbd_generated.csv",
+        dtype=str,
+        keep_default_na=False,
     )
-    auto_df = pd.read_csv(
-        file_path
-        / "intermediate"
-        / scan_type
-        / f"{scan_type}_intermediate_automated.csv"
+    auto_df = read_intermediate(
+        file_path, scan_type, auto_keys + auto_cols, rendered=True
     )
+    auto_df = auto_df.astype(object).where(auto_df.notna(), "").astype(str)
+    if ROW_NUMBER_COLUMN in auto_keys:
+        # The Parquet intermediate data has no index column, the rows are numbered as in its CSV export
+        auto_df[ROW_NUMBER_COLUMN] = auto_df.index.astype(str)
 
     if len(auto_df) != len(gbd_df):
         raise ValueError(
@@ -186,8 +343,17 @@ def process_scans(file_path: Path, scan_type, gbd_keys, auto_keys, gbd_cols, aut
             f"Number of columns to compare in gbd dataset ({len(gbd_cols)}) is different from number of columns to compare in the automated dataset ({len(auto_cols)})."
         )
 
-    if file_path == "test-data-recon1":
-        gbd_df["index"] = gbd_df.index
-    # Call for specified columns
-    for i in range(len(auto_cols)):
-        compare_dfs(gbd_keys, auto_keys, gbd_cols[i], auto_cols[i], gbd_df, auto_df)
+    if "index" in gbd_keys:
+        gbd_df["index"] = gbd_df.index.astype(str)
+    # All the columns are compared on a single join of both datasets
+    return validate_columns(
+        gbd_keys,
+        auto_keys,
+        gbd_cols,
+        auto_cols,
+        gbd_df,
+        auto_df,
+        file_path,
+        scan_type,
+        export_csv,
+    )
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def rule_mask(df, condition):
+    """
+    Evaluates the condition of a rule over the whole dataframe
+
+    Parameters:
+    - df (dataframe): Scan data
+    - condition (function): Takes the dataframe and returns a boolean Series of the matching rows
+
+    Returns:
+    - (array): Boolean mask of the matching rows, missing values never match
+    """
+
+    return np.asarray(condition(df).fillna(False), dtype=bool)
+
+
+def apply_rules(df, rules, considered_col="Considered", comment_col="Comment"):
+    """
+    Applies an ordered table of classification rules to set the considered/comment columns.
+    Each rule is a (condition, considered, comment) tuple:
+    - condition (function): Takes the dataframe and returns a boolean Series of the matching rows
+    - considered (string): Value of the considered column for the matching rows, unchanged when None
+    - comment (string): Value of the comment column for the matching rows, unchanged when None
+
+    Every rule is evaluated as one whole-frame operation, in order, so a later rule overrides
+    the values set by an earlier one and its condition can look at them.
+
+    Parameters:
+    - df (dataframe): Scan data with the considered/comment columns already created
+    - rules (list): Ordered table of rules
+    - considered_col (string): Name of the considered column
+    - comment_col (string): Name of the comment column
+
+    Returns:
+    - (dataframe): Scan data with the considered/comment columns updated
+    """
+
+    for condition, considered, comment in rules:
+        mask = rule_mask(df, condition)
+
+        if considered is not None:
+            df[considered_col] = df[considered_col].mask(mask, considered)
+        if comment is not None:
+            df[comment_col] = df[comment_col].mask(mask, comment)
+
+    return df
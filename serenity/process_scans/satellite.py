@@ -1,6 +1,60 @@
+import numpy as np
 import pandas as pd
-
-
+from .hostname_index import in_vcenter
+from .pre_process import is_missing
+from .rules import apply_rules
+from ..profiling import profiled
+
+# Classification rules as (condition, Considered, Comment), see rules.apply_rules
+VIRTWHO_RULES = [
+    # Servers having 'virt-who' as hostname are hypervisors
+    (
+        lambda df: df["hostname_trimmed"].str.contains("virt-who", regex=False),
+        "N",
+        "hypervisor",
+    ),
+]
+
+MISSING_SERVER_RULES = [
+    # Servers having neither uuid nor os name
+    (
+        lambda df: is_missing(df["uuid"]) & is_missing(df["os_name"]),
+        "N",
+        "details missing for server",
+    ),
+]
+
+NON_RHEL_RULES = [
+    (
+        lambda df: ~(
+            df["os_name"].isin(("RHEL", "RedHat", "RedHat_Workstation", "Redhat"))
+            | is_missing(df["os_name"])
+        ),
+        "N",
+        "Non-RHEL",
+    ),
+]
+
+DUPLICATE_RULES = [
+    # Servers already reported in vcenter
+    (lambda df: df["Duplicate"] == "Y", "N", "Duplicate (reported in vcenter)"),
+    # Rest all are considered servers
+    (lambda df: df["Considered"] == "", "Y", None),
+]
+
+PHYSICAL_SERVER_RULES = [
+    # Considered servers with missing server type are assumed as Physical
+    (
+        lambda df: (df["Considered"] == "Y")
+        & (df["num_sockets"].isin(("1", 1)) | is_missing(df["num_sockets"]))
+        & (df["is_virtualized"].isin(("Unknown",)) | is_missing(df["is_virtualized"])),
+        None,
+        "Assumed as Physical (2-Socket) ",
+    ),
+]
+
+
+@profiled
 def trim_hostname(satellite_df):
     """
     Trims the hostname name in Satellite data
@@ -12,7 +66,7 @@ def trim_hostname(satellite_df):
     - (dataframe): Satellite data with trimmed hostname name
     """
 
-    satellite_df = satellite_df.query('hostname != "-"')
+    satellite_df = satellite_df[~is_missing(satellite_df["hostname"])].copy()
     satellite_df["hostname_trimmed"] = satellite_df["hostname"].apply(
         lambda x: x.split(".", 1)[0]
     )
@@ -20,6 +74,7 @@ def trim_hostname(satellite_df):
     return satellite_df
 
 
+@profiled
 def get_install_date(satellite_df):
     """
     Converts the registration time in Satellite data to datetime format
@@ -43,6 +98,7 @@ def get_install_date(satellite_df):
     return satellite_df
 
 
+@profiled
 def virtwho_check(satellite_df):
     """
     Checks for servers having 'virt-who' as hostname in Satellite data
@@ -55,18 +111,14 @@ def virtwho_check(satellite_df):
     - (dataframe): Satellite data marked with hypervisor servers
     """
 
-    # Create the 'Considered' column
-    satellite_df["Considered"] = satellite_df["hostname_trimmed"].map(
-        lambda x: "N" if "virt-who" in x else ""
-    )
-    # Create the 'Comment' column
-    satellite_df["Comment"] = satellite_df["hostname_trimmed"].map(
-        lambda x: "hypervisor" if "virt-who" in x else ""
-    )
+    # Create the 'Considered' and 'Comment' columns
+    satellite_df["Considered"] = ""
+    satellite_df["Comment"] = ""
 
-    return satellite_df
+    return apply_rules(satellite_df, VIRTWHO_RULES)
 
 
+@profiled
 def check_server_type(satellite_df):
     """
     Check if a server in Satellite data is Physical, Virtual or Hypervisor
@@ -80,20 +132,19 @@ def check_server_type(satellite_df):
 
     # convert virt_type column to lower case
     satellite_df["virt_type"] = satellite_df["virt_type"].str.lower()
-    satellite_df["phy_vir"] = satellite_df.apply(
-        lambda x: "Physical"
-        if x["virt_type"] in ["not applicable", "-"]
-        else "Virtual",
-        axis=1,
+    physical = satellite_df["virt_type"].isin(["not applicable"]) | is_missing(
+        satellite_df["virt_type"]
     )
-    satellite_df["phy_vir"] = satellite_df.apply(
-        lambda x: "hypervisor" if "virt-who" in x["hostname_trimmed"] else x["phy_vir"],
-        axis=1,
+    satellite_df["phy_vir"] = physical.map({True: "Physical", False: "Virtual"})
+    satellite_df["phy_vir"] = satellite_df["phy_vir"].mask(
+        satellite_df["hostname_trimmed"].str.contains("virt-who", regex=False),
+        "hypervisor",
     )
 
     return satellite_df
 
 
+@profiled
 def check_missing_servers(satellite_df):
     """
     Check for servers in Satellite data having missing values
@@ -105,22 +156,10 @@ def check_missing_servers(satellite_df):
     - (dataframe): Satellite data marked with servers having missing values
     """
 
-    satellite_df["Comment"] = satellite_df.apply(
-        lambda x: "details missing for server"
-        if (x["uuid"] == "-" and x["os_name"] == "-")
-        else x["Comment"],
-        axis=1,
-    )
-    satellite_df["Considered"] = satellite_df.apply(
-        lambda x: "N"
-        if x["Comment"] == "details missing for server"
-        else x["Considered"],
-        axis=1,
-    )
-
-    return satellite_df
+    return apply_rules(satellite_df, MISSING_SERVER_RULES)
 
 
+@profiled
 def check_nonrhel_servers(satellite_df):
     """
     Check for non-RHEL servers in Satellite data
@@ -132,55 +171,31 @@ def check_nonrhel_servers(satellite_df):
     - (dataframe): Satellite data marked with non-RHEL servers
     """
 
-    satellite_df["Comment"] = satellite_df.apply(
-        lambda x: "Non-RHEL"
-        if x["os_name"] not in ("RHEL", "RedHat", "RedHat_Workstation", "-", "Redhat")
-        else x["Comment"],
-        axis=1,
-    )
-    satellite_df["Considered"] = satellite_df.apply(
-        lambda x: "N" if x["Comment"] == "Non-RHEL" else x["Considered"], axis=1
-    )
-
-    return satellite_df
+    return apply_rules(satellite_df, NON_RHEL_RULES)
 
 
+@profiled
 def check_duplicates_satellite(satellite_df, intermediate_vcenter_df):
     """
     Check for duplicates in Satellite data
 
     Parameters:
     - satellite_df (dataframe): Normalized Satellite data
-    - intermediate_vcenter_df (dataframe): Intermediate/processed Vcenter data
+    - intermediate_vcenter_df: vCenter hostname index (see hostname_index) or Intermediate/processed Vcenter data
 
     Returns:
     - (dataframe): Satellite data with duplicate entries marked
     """
 
     # checking for satellite server names already present in vcenter data
-    satellite_df["Duplicate"] = (
-        satellite_df["hostname_trimmed"]
-        .isin(intermediate_vcenter_df["vm.dns_name_trimmed"])
-        .map({True: "Y", False: "N"})
-    )
-
-    satellite_df["Comment"] = satellite_df.apply(
-        lambda x: "Duplicate (reported in vcenter)"
-        if x["Duplicate"] == "Y"
-        else x["Comment"],
-        axis=1,
-    )
+    satellite_df["Duplicate"] = in_vcenter(
+        satellite_df["hostname_trimmed"], intermediate_vcenter_df
+    ).map({True: "Y", False: "N"})
 
-    satellite_df["Considered"] = satellite_df.apply(
-        lambda x: "N" if x["Duplicate"] == "Y" else x["Considered"], axis=1
-    )
-
-    # Rest all are considered servers
-    satellite_df["Considered"].replace("", "Y", inplace=True)
-
-    return satellite_df
+    return apply_rules(satellite_df, DUPLICATE_RULES)
 
 
+@profiled
 def identify_physical_servers(satellite_df):
     """
     Check for servers with missing server type and identify if they are Physical servers
@@ -192,13 +207,83 @@ def identify_physical_servers(satellite_df):
     - (dataframe): Satellite data with servers marked and assumed as Physical
     """
 
-    satellite_df["Comment"] = satellite_df.apply(
-        lambda x: "Assumed as Physical (2-Socket) "
-        if x["Considered"] == "Y"
-        and (x["num_sockets"] in ("1", "-"))
-        and (x["is_virtualized"] in ("Unknown", "-"))
-        else x["Comment"],
-        axis=1,
+    return apply_rules(satellite_df, PHYSICAL_SERVER_RULES)
+
+
+@profiled
+def process_satellite(satellite_df, intermediate_vcenter_df):
+    """
+    Fused Satellite classification computing all the derived columns in a single planned pass.
+    It gives the same results as running trim_hostname, get_install_date, virtwho_check, check_server_type,
+    check_missing_servers, check_nonrhel_servers, check_duplicates_satellite and identify_physical_servers
+    one after the other, which stay as the reference implementation.
+
+    Parameters:
+    - satellite_df (dataframe): Normalized Satellite data
+    - intermediate_vcenter_df: vCenter hostname index (see hostname_index) or Intermediate/processed Vcenter data
+
+    Returns:
+    - (dataframe): Satellite data with the hostname_trimmed, install_date, Considered, Comment, phy_vir
+      and Duplicate columns
+    """
+
+    satellite_df = satellite_df[~is_missing(satellite_df["hostname"])]
+    hostname_trimmed = satellite_df["hostname"].str.split(".", n=1).str[0]
+    virt_type = satellite_df["virt_type"].str.lower()
+
+    install_date = pd.to_datetime(
+        satellite_df["registration_time"],
+        format="%Y-%m-%d %H:%M:%S UTC",
+        errors="coerce",
+    ).dt.date.fillna("-")
+
+    # Every condition is evaluated once on the source columns
+    hypervisor = hostname_trimmed.str.contains("virt-who", regex=False)
+    details_missing = is_missing(satellite_df["uuid"]) & is_missing(
+        satellite_df["os_name"]
+    )
+    non_rhel = ~(
+        satellite_df["os_name"].isin(("RHEL", "RedHat", "RedHat_Workstation", "Redhat"))
+        | is_missing(satellite_df["os_name"])
+    )
+    duplicate = in_vcenter(hostname_trimmed, intermediate_vcenter_df)
+    not_considered = hypervisor | details_missing | non_rhel | duplicate
+    assumed_physical = (
+        ~not_considered
+        & (
+            satellite_df["num_sockets"].isin(("1", 1))
+            | is_missing(satellite_df["num_sockets"])
+        )
+        & (
+            satellite_df["is_virtualized"].isin(("Unknown",))
+            | is_missing(satellite_df["is_virtualized"])
+        )
     )
 
-    return satellite_df
+    # Same precedence as the reference stages: the later a stage sets a comment, the earlier it comes here
+    comment = np.select(
+        [assumed_physical, duplicate, non_rhel, details_missing, hypervisor],
+        [
+            "Assumed as Physical (2-Socket) ",
+            "Duplicate (reported in vcenter)",
+            "Non-RHEL",
+            "details missing for server",
+            "hypervisor",
+        ],
+        default="",
+    )
+    phy_vir = np.select(
+        [hypervisor, virt_type.isin(["not applicable"]) | is_missing(virt_type)],
+        ["hypervisor", "Physical"],
+        default="Virtual",
+    )
+
+    return satellite_df.assign(
+        virt_type=virt_type,
+        hostname_trimmed=hostname_trimmed,
+        install_date=install_date,
+        Considered=np.where(not_considered, "N", "Y"),
+        Comment=comment,
+        phy_vir=phy_vir,
+        Duplicate=np.where(duplicate, "Y", "N"),
+    )
@@ -1,6 +1,32 @@
 import pandas as pd
-
-
+from .os_names import split_os_names
+from .rules import apply_rules
+from ..profiling import profiled
+
+# Classification rules as (condition, Considered, Comment), see rules.apply_rules
+RED_HAT_RULES = [
+    # Consider only Red Hat Servers
+    (
+        lambda df: ~df["vm.os"].str.contains(
+            "Red Hat Enterprise Linux", regex=False, na=False
+        ),
+        "N",
+        "Non Red Hat Server",
+    ),
+]
+
+TEMPLATE_DISCOVERY_RULES = [
+    # Template or Discovery servers are ignored
+    (
+        lambda df: df["vm.name"].str.lower().str.contains("template|discovery")
+        | df["vm.dns_name_trimmed"].str.lower().str.contains("template|discovery"),
+        "N",
+        "Template or Discovery server",
+    ),
+]
+
+
+@profiled
 def trim_cm_dns_name(v_center_df):
     """
     Trims the DNS name in VCenter data
@@ -12,13 +38,14 @@ def trim_cm_dns_name(v_center_df):
     - (dataframe): Vcenter data with trimmed DNS name
     """
 
-    v_center_df["vm.dns_name_trimmed"] = v_center_df["vm.dns_name"].apply(
-        lambda x: x.split(".", 1)[0]
+    v_center_df["vm.dns_name_trimmed"] = (
+        v_center_df["vm.dns_name"].fillna("-").apply(lambda x: x.split(".", 1)[0])
     )
 
     return v_center_df
 
 
+@profiled
 def add_considered_comment(v_center_df):
     """
     Create the considered and comment columns to select which servers to consider
@@ -31,19 +58,14 @@ def add_considered_comment(v_center_df):
     - (dataframe): Vcenter data marked with Red Hat and Non Red Hat Servers
     """
 
-    # Create the 'Considered' column
-    v_center_df["Considered"] = v_center_df["vm.os"].apply(
-        lambda x: "Y" if "Red Hat Enterprise Linux" in x else "N"
-    )
-
-    # Create the 'Comment' column
-    v_center_df["Comment"] = v_center_df.apply(
-        lambda row: "Non Red Hat Server" if row["Considered"] == "N" else "", axis=1
-    )
+    # Create the 'Considered' and 'Comment' columns
+    v_center_df["Considered"] = "Y"
+    v_center_df["Comment"] = ""
 
-    return v_center_df
+    return apply_rules(v_center_df, RED_HAT_RULES)
 
 
+@profiled
 def split_rh_nonrh(v_center_df):
     """
     Splits Vcenter data into 2 dataframes Red hat and Non Red Hat based on the server type
@@ -63,6 +85,7 @@ def split_rh_nonrh(v_center_df):
     return red_hat_servers, non_red_hat_servers
 
 
+@profiled
 def ignore_template_and_discovery(red_hat_servers):
     """
     Check for Template or Discovery servers and ignore them
@@ -74,31 +97,10 @@ def ignore_template_and_discovery(red_hat_servers):
     - (dataframe): Red Hat servers dataframe with discovery and template type servers ignored
     """
 
-    # Update the 'Considered' column
-    red_hat_servers["Considered"] = red_hat_servers.apply(
-        lambda row: "N"
-        if "template" in row["vm.name"].lower()
-        or "template" in row["vm.dns_name_trimmed"].lower()
-        or "discovery" in row["vm.name"].lower()
-        or "discovery" in row["vm.dns_name_trimmed"].lower()
-        else row["Considered"],
-        axis=1,
-    )
-
-    # Update the 'Comment' column
-    red_hat_servers["Comment"] = red_hat_servers.apply(
-        lambda row: "Template or Discovery server"
-        if "template" in row["vm.name"].lower()
-        or "template" in row["vm.dns_name_trimmed"].lower()
-        or "discovery" in row["vm.name"].lower()
-        or "discovery" in row["vm.dns_name_trimmed"].lower()
-        else row["Comment"],
-        axis=1,
-    )
-
-    return red_hat_servers
+    return apply_rules(red_hat_servers, TEMPLATE_DISCOVERY_RULES)
 
 
+@profiled
 def check_duplicates(red_hat_servers):
     """
     This does a multi step processing to check for duplicates in Red Hat servers
@@ -117,6 +119,7 @@ def check_duplicates(red_hat_servers):
     return red_hat_servers
 
 
+@profiled
 def duplicate_strategy_1(red_hat_servers):
     """
     Marks Duplicates in vm.dns_name_trimmed
@@ -135,83 +138,117 @@ def duplicate_strategy_1(red_hat_servers):
     return red_hat_servers
 
 
+@profiled
 def duplicate_strategy_2(red_hat_servers):
     """
     If Duplicate vm.dns_name_trimmed, check Powered state
 
+    Each group of servers sharing a trimmed DNS name is resolved at once with group-wise operations
+
     Parameters:
     - red_hat_servers (dataframe): Red Hat server dataframe
 
     Returns:
     - (dataframe): Red Hat servers marked with duplicates based on Powered state
     """
-    # Filter rows marked as "True" in the "Same" column
-    duplicate_rows = red_hat_servers[red_hat_servers["Same"]]
-
-    # Iterate over the filtered duplicate rows to update the 'Considered' and 'Comment' columns
-    for _, row in duplicate_rows.iterrows():
-        dns_name = row["vm.dns_name_trimmed"]
-
-        # for a potentially duplicate trimmed dns name, what are the other same trimmed dns name rows
-        same_dns_rows = red_hat_servers[
-            red_hat_servers["vm.dns_name_trimmed"] == dns_name
-        ]
-
-        # First, we check whether the servers with the same trimmed DNS name and also VM name are powered on
-        # If all are "poweredOn", we update consider all
-
-        # If there are multiple rows, some with "poweredOn" and some with "poweredOff" state
-        # we consider the one which is Powered on
-
-        # If there are multiple rows, all are "poweredOff" state
-        # we consider any
-
-        # Servers have exactly the same trimmed DNS name and also same VM name
-        if same_dns_rows["vm.name"].nunique() == 1:
-            # For these servers, what are the powered states
-            states = same_dns_rows["vm.state"].unique()
-
-            p_on_index_list = list(
-                same_dns_rows[same_dns_rows["vm.state"] == "poweredOn"].index
-            )
-            p_off_index_list = set(same_dns_rows.index) - set(p_on_index_list)
-
-            # If both are powered on consider all
-            if len(states) == 1 and states == "poweredOn":
-                same_dns_rows.loc[same_dns_rows.index, "Considered"] = "Y"
-
-            # If both are powered off consider any
-            elif len(states) == 1 and states == "poweredOff":
-                same_dns_rows.loc[same_dns_rows.index[0], "Considered"] = "Y"
-                same_dns_rows.loc[
-                    same_dns_rows.index[0], "Comment"
-                ] = "Duplicate Considering any one"
-                same_dns_rows.loc[same_dns_rows.index[0] + 1 :, "Considered"] = "N"
-                same_dns_rows.loc[same_dns_rows.index[0] + 1 :, "Duplicate"] = "Y"
-
-            # If one of them is powered on and others are powered off, consider the one that is powered on
-            elif len(states) == 2:
-                same_dns_rows.loc[p_on_index_list[0], "Considered"] = "Y"
-                same_dns_rows.loc[
-                    p_on_index_list[0], "Comment"
-                ] = "Duplicate Considering only Powered On"
-                same_dns_rows.loc[list(p_off_index_list), "Considered"] = "N"
-                same_dns_rows.loc[list(p_off_index_list), "Duplicate"] = "Y"
-
-            else:
-                print("Unknown states. vm.state must be poweredOn or poweredOff")
-
-            # Update the 'Considered' and 'Comment' columns in the original DataFrame
-            red_hat_servers.update(same_dns_rows[["Considered", "Comment"]])
+    # Groups of trimmed dns names having at least one row marked as "True" in the "Same" column
+    duplicate_names = red_hat_servers.loc[
+        red_hat_servers["Same"].astype(bool), "vm.dns_name_trimmed"
+    ].unique()
+    same_dns_rows = red_hat_servers[
+        red_hat_servers["vm.dns_name_trimmed"].isin(duplicate_names)
+    ]
+
+    if same_dns_rows.empty:
+        return red_hat_servers
+
+    dns_names = same_dns_rows["vm.dns_name_trimmed"]
+    groups = same_dns_rows.groupby(dns_names, sort=False)
+    states = same_dns_rows["vm.state"].astype(object).fillna("-")
+    powered_on = states == "poweredOn"
+
+    # First, we check whether the servers with the same trimmed DNS name and also VM name are powered on
+    # If all are "poweredOn", we update consider all
+
+    # If there are multiple rows, some with "poweredOn" and some with "poweredOff" state
+    # we consider the one which is Powered on
+
+    # If there are multiple rows, all are "poweredOff" state
+    # we consider any
+
+    # Servers have exactly the same trimmed DNS name and also same VM name, a missing VM name being "-"
+    vm_names = same_dns_rows["vm.name"].astype(object).fillna("-")
+    same_vm_name = vm_names.groupby(dns_names, sort=False).transform("nunique") == 1
+    num_states = states.groupby(dns_names, sort=False).transform("nunique")
+
+    all_powered_on = same_vm_name & (num_states == 1) & powered_on
+    all_powered_off = same_vm_name & (num_states == 1) & (states == "poweredOff")
+    mixed = same_vm_name & (num_states == 2)
+
+    first_row = groups.cumcount() == 0
+    first_powered_on = powered_on & (powered_on.groupby(dns_names).cumsum() == 1)
+
+    # If both are powered on consider all
+    considered_rows = all_powered_on | (all_powered_off & first_row)
+    red_hat_servers.loc[considered_rows[considered_rows].index, "Considered"] = "Y"
+
+    # If both are powered off consider any
+    keep_any = all_powered_off & first_row
+    red_hat_servers.loc[keep_any[keep_any].index, "Comment"] = (
+        "Duplicate Considering any one"
+    )
+
+    # If one of them is powered on and others are powered off, consider the one that is powered on
+    keep_powered_on = mixed & first_powered_on
+    red_hat_servers.loc[keep_powered_on[keep_powered_on].index, "Considered"] = "Y"
+    red_hat_servers.loc[keep_powered_on[keep_powered_on].index, "Comment"] = (
+        "Duplicate Considering only Powered On"
+    )
+
+    # The rest of the group is not considered and marked as duplicate
+    dropped = (all_powered_off & ~first_row) | (mixed & ~powered_on)
+    red_hat_servers.loc[dropped[dropped].index, "Considered"] = "N"
+    red_hat_servers.loc[dropped[dropped].index, "Duplicate"] = "Y"
+
+    unknown = same_vm_name & ~(all_powered_on | all_powered_off | mixed)
+    for _ in dns_names[unknown].unique():
+        print("Unknown states. vm.state must be poweredOn or poweredOff")
 
     return red_hat_servers
 
 
+def similar_name_root(name):
+    """
+    Strips the test, clone, new and old variant markers from a VM name
+
+    Parameters:
+    - name (string): VM name
+
+    Returns:
+    - (string): Root name shared by all the variants of a server
+    """
+
+    return (
+        name.replace("_test", "")
+        .replace("_clone", "")
+        .replace("_new", "")
+        .replace("_old", "")
+        .replace("old", "")
+        .replace("test", "")
+        .replace("clone", "")
+        .replace("new", "")
+    )
+
+
+@profiled
 def duplicate_strategy_3(red_hat_servers):
     """
     If servers have slightly different names, with only a slight difference like test, clone, new
     mark duplicates based on powered state
 
+    Similar names are grouped with a hash map from root name to servers, so every name is
+    canonicalised once instead of scanning all the names for each test, clone, new server
+
     Parameters:
     - red_hat_servers (dataframe): Red Hat server dataframe
 
@@ -221,37 +258,25 @@ def duplicate_strategy_3(red_hat_servers):
 
     # If servers have slightly different names, with only a slight difference like test, clone, new
 
-    duplicates = pd.DataFrame()
-
-    for index, row in red_hat_servers.iterrows():
-        name = row["vm.name"]
-
-        if "test" in name or "clone" in name or "new" in name:
-            original_name = (
-                name.replace("_test", "")
-                .replace("_clone", "")
-                .replace("_new", "")
-                .replace("_old", "")
-                .replace("old", "")
-                .replace("test", "")
-                .replace("clone", "")
-                .replace("new", "")
-            )
-            similar_rows = red_hat_servers[
-                red_hat_servers["vm.name"].str.contains(original_name)
-            ]
-
-            if not similar_rows.empty:
-                duplicates = pd.concat([duplicates, similar_rows], ignore_index=False)
-                # Mark duplicate rows by the root original name
-                duplicates.loc[similar_rows.index, "temp_group_marker"] = original_name
-
-    if not duplicates.empty:
-        grouped = duplicates.groupby("temp_group_marker")
+    names = red_hat_servers["vm.name"].fillna("-")
+    is_variant = names.str.contains("test|clone|new", regex=True)
+
+    # Index every server by its root name, names without any variant marker are their own root
+    has_marker = is_variant | names.str.contains("old", regex=False)
+    root_names = {name: similar_name_root(name) for name in names[has_marker].unique()}
+    roots = names.map(lambda name: root_names.get(name, name))
+
+    # Only the roots of test, clone, new servers make a group
+    variant_roots = roots[is_variant & (roots != "")].unique()
+    in_group = roots.isin(variant_roots)
+
+    if in_group.any():
+        duplicates = red_hat_servers[in_group]
+        grouped = duplicates.groupby(roots[in_group])
 
         for group_name, group_df in grouped:
             # There has to be atleast 2 similar names
-            # Coz previous loop saves even those rows which have
+            # Coz a root is indexed for every name which has
             # clone, test, new in name
             # But there is not neccesarily a copy of that name without
             # the clone, test, new
@@ -267,9 +292,9 @@ def duplicate_strategy_3(red_hat_servers):
                     )
                     print("Keeping all servers since Powered On")
                     red_hat_servers.loc[group_df.index, "Same"] = True
-                    red_hat_servers.loc[
-                        group_df.index, "Comment"
-                    ] = "Duplicate test, new, clone"
+                    red_hat_servers.loc[group_df.index, "Comment"] = (
+                        "Duplicate test, new, clone"
+                    )
                     red_hat_servers.loc[group_df.index, "Considered"] = "Y"
 
                 elif "poweredOn" in states:
@@ -285,9 +310,9 @@ def duplicate_strategy_3(red_hat_servers):
                     p_off_index_list = list(set(group_df.index) - set(p_on_index_list))
 
                     red_hat_servers.loc[group_df.index, "Same"] = True
-                    red_hat_servers.loc[
-                        group_df.index, "Comment"
-                    ] = "Duplicate test, new, clone"
+                    red_hat_servers.loc[group_df.index, "Comment"] = (
+                        "Duplicate test, new, clone"
+                    )
                     red_hat_servers.loc[p_on_index_list, "Considered"] = "Y"
                     red_hat_servers.loc[p_off_index_list, "Considered"] = "N"
                     red_hat_servers.loc[p_on_index_list, "Duplicate"] = "Y"
@@ -305,12 +330,12 @@ def duplicate_strategy_3(red_hat_servers):
                     )
                     print("Keeping one of the servers")
                     red_hat_servers.loc[group_df.index, "Same"] = True
-                    red_hat_servers.loc[
-                        group_df.index, "Comment"
-                    ] = "Duplicate test, new, clone"
+                    red_hat_servers.loc[group_df.index, "Comment"] = (
+                        "Duplicate test, new, clone"
+                    )
                     red_hat_servers.loc[group_df.index[0], "Considered"] = "Y"
-                    red_hat_servers.loc[p_off_index_list[1:], "Considered"] = "N"
-                    red_hat_servers.loc[p_off_index_list[1:], "Duplicate"] = "Y"
+                    red_hat_servers.loc[group_df.index[1:], "Considered"] = "N"
+                    red_hat_servers.loc[group_df.index[1:], "Duplicate"] = "Y"
 
                 else:
                     print("Unknown states. vm.state must be poweredOn or poweredOff")
@@ -318,6 +343,7 @@ def duplicate_strategy_3(red_hat_servers):
     return red_hat_servers
 
 
+@profiled
 def merge_rn_nonrh(red_hat_servers, non_red_hat_servers):
     """
     Merge the Red Hat servers (after processing) with the Non Red Hat server data and aggregate into signle dataframe
@@ -335,6 +361,7 @@ def merge_rn_nonrh(red_hat_servers, non_red_hat_servers):
     return final_details_df
 
 
+@profiled
 def product_name_version(v_center_df):
     """
     Split "vm.os" column into "Product Name" and "Version" columns
@@ -346,97 +373,9 @@ def product_name_version(v_center_df):
     - (dataframe): Vcenter data with OS split into product name and version
     """
 
-    # Split "vm.os" column into "Product Name" and "Version" columns
-
-    v_center_df[["Product Name", "Version"]] = v_center_df["vm.os"].str.extract(
-        r"^(.*?)\s*(\(.*\)|\d.*)?$"
+    # Each distinct OS string is parsed once, see os_names.split_os_names
+    v_center_df["Product Name"], v_center_df["Version"] = split_os_names(
+        v_center_df["vm.os"]
     )
 
-    # Apply the following regex pattern only to rows containing "Microsoft Windows XP"
-    mask1 = v_center_df["vm.os"].str.contains("Microsoft Windows XP")
-
-    # Extract the parts using regex for the masked rows
-    v_center_df.loc[mask1, "Product Name"] = v_center_df.loc[
-        mask1, "vm.os"
-    ].str.extract(r"(Microsoft Windows).*?(XP.*)", expand=False)[0]
-    v_center_df.loc[mask1, "Version"] = v_center_df.loc[mask1, "vm.os"].str.extract(
-        r"(Microsoft Windows).*?(XP.*)", expand=False
-    )[1]
-
-    # Mask for rows starting with "Other"
-    mask2 = v_center_df["vm.os"].str.startswith("Other")
-
-    # Extract the parts using regex for the masked rows
-    v_center_df.loc[mask2, "Product Name"] = "Other"
-    v_center_df.loc[mask2, "Version"] = v_center_df.loc[mask2, "vm.os"].str.extract(
-        r"Other(.*)"
-    )[0]
-
-    # Strip leading/trailing spaces in the columns
-    v_center_df["Product Name"] = v_center_df["Product Name"].str.strip()
-    v_center_df["Version"] = v_center_df["Version"].str.strip()
-
-    # Where Version is None save it as '-'
-    v_center_df["Version"].fillna("-", inplace=True)
-
     return v_center_df
-
-
-def reorder_based_on(gbd_keys, auto_keys, gbd, auto):
-    """
-    Sort GBD and Automatically generated dataframes based on primary keys
-
-    Parameters:
-    - gbd_keys (list): List of keys in GBD result that will be used for re-ordering
-    - auto_keys (list): List of keys in Automated result that will be used for re-ordering
-    - gbd (dataframe): GBD generated dataframe
-    - auto (dataframe): Automatically generated dataframe
-
-    Returns:
-    - (dataframe), (dataframe): GBD and Automatically generated dataframes sorted so that their rows match
-    """
-
-    gbd_keys = [key + "_gbd" for key in gbd_keys]
-    auto_keys = [key + "_auto" for key in auto_keys]
-    auto = auto.add_suffix("_auto")
-    gbd = gbd.add_suffix("_gbd")
-
-    merged_df = pd.merge(gbd, auto, left_on=gbd_keys, right_on=auto_keys)
-
-    if merged_df.empty:
-        raise ValueError(
-            "Rows in G data and Auto generated data cannot be ordered the same way. Comparison results are invalid"
-        )
-
-    return merged_df
-
-
-def compare_dfs(gbd_keys, auto_keys, gbd_col, auto_col, gbd, auto):
-    """
-    Compares the GBD and Automatically generated dataframes and prints out the accuracy
-
-    Parameters:
-    - gbd_keys (list): List of keys in GBD result that will be used for re-ordering
-    - auto_keys (list): List of keys in Automated result that will be used for re-ordering
-    - gbd_col (string): Column from the GBD dataframe that you want to compare with Automated dataset
-    - auto_col (string): Column from the Automated dataframe that you want to compare with GBD dataset
-    - gbd (dataframe): GBD generated dataframe
-    - auto (dataframe): Automatically generated dataframe
-
-    """
-
-    merged = reorder_based_on(gbd_keys, auto_keys, gbd, auto)
-
-    mismatched_rows_auto = merged[
-        merged[auto_col + "_auto"] != merged[gbd_col + "_gbd"]
-    ][auto_col + "_auto"]
-    mismatched_rows_gbd = merged[
-        merged[auto_col + "_auto"] != merged[gbd_col + "_gbd"]
-    ][gbd_col + "_gbd"]
-
-    accuracy = (len(merged) - len(mismatched_rows_auto)) * 100 / len(merged)
-    print("For ", gbd_col, "accuracy in % is ", accuracy)
-
-    if accuracy != 100:
-        print(mismatched_rows_auto)
-        print(mismatched_rows_gbd)
@@ -0,0 +1,307 @@
+from pathlib import Path
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from ..profiling import profiled
+
+# Number of mismatched rows converted and written at a time
+MISMATCH_CHUNK_SIZE = 100_000
+
+
+def check_key_multiplicity(gbd, auto, gbd_keys, auto_keys):
+    """
+    Checks that joining the GBD and Automatically generated dataframes on their keys can not blow up,
+    i.e. that no key is repeated in both of them
+
+    Parameters:
+    - gbd (dataframe): GBD generated dataframe
+    - auto (dataframe): Automatically generated dataframe
+    - gbd_keys (list): List of keys in GBD result
+    - auto_keys (list): List of keys in Automated result
+    """
+
+    gbd_counts = gbd.value_counts(gbd_keys, dropna=False).rename("gbd")
+    auto_counts = auto.value_counts(auto_keys, dropna=False).rename("auto")
+    auto_counts.index.names = gbd_counts.index.names
+
+    counts = pd.concat([gbd_counts, auto_counts], axis=1, join="inner")
+    many_to_many = counts[(counts["gbd"] > 1) & (counts["auto"] > 1)]
+
+    if not many_to_many.empty:
+        raise ValueError(
+            f"{len(many_to_many)} keys are repeated in both the GBD and Auto generated data, joining them would give "
+            f"{int((counts['gbd'] * counts['auto']).sum())} rows. Comparison results would be invalid"
+        )
+
+
+@profiled
+def merge_on_keys(gbd_keys, auto_keys, gbd_cols, auto_cols, gbd, auto):
+    """
+    Joins the GBD and Automatically generated dataframes once on their keys, keeping only the keys and compared columns
+
+    Parameters:
+    - gbd_keys (list): List of keys in GBD result that will be used for matching the rows
+    - auto_keys (list): List of keys in Automated result that will be used for matching the rows
+    - gbd_cols (list): Columns from the GBD dataframe that are compared
+    - auto_cols (list): Columns from the Automated dataframe that are compared
+    - gbd (dataframe): GBD generated dataframe
+    - auto (dataframe): Automatically generated dataframe
+
+    Returns:
+    - (dataframe): Matching rows, with the GBD columns suffixed by "_gbd" and the Automated ones by "_auto"
+    """
+
+    check_key_multiplicity(gbd, auto, gbd_keys, auto_keys)
+
+    gbd = gbd[list(dict.fromkeys(gbd_keys + gbd_cols))].add_suffix("_gbd")
+    auto = auto[list(dict.fromkeys(auto_keys + auto_cols))].add_suffix("_auto")
+
+    merged_df = pd.merge(
+        gbd,
+        auto,
+        left_on=[key + "_gbd" for key in gbd_keys],
+        right_on=[key + "_auto" for key in auto_keys],
+    )
+
+    if merged_df.empty:
+        raise ValueError(
+            "Rows in G data and Auto generated data cannot be ordered the same way. Comparison results are invalid"
+        )
+
+    return merged_df
+
+
+@profiled
+def compare_columns(merged_df, gbd_cols, auto_cols):
+    """
+    Compares all the columns of the joined dataframes in one vectorized pass
+
+    Parameters:
+    - merged_df (dataframe): Output of merge_on_keys
+    - gbd_cols (list): Columns from the GBD dataframe to compare
+    - auto_cols (list): Columns from the Automated dataframe to compare, in the same order
+
+    Returns:
+    - (dataframe), (Series): Mismatch mask with one column per GBD column, and the accuracy in % of each GBD column
+    """
+
+    auto_values = merged_df[[column + "_auto" for column in auto_cols]].to_numpy(
+        dtype=object
+    )
+    gbd_values = merged_df[[column + "_gbd" for column in gbd_cols]].to_numpy(
+        dtype=object
+    )
+
+    mismatches = pd.DataFrame(
+        auto_values != gbd_values, index=merged_df.index, columns=gbd_cols
+    )
+    accuracies = (len(merged_df) - mismatches.sum()) * 100 / len(merged_df)
+
+    return mismatches, accuracies
+
+
+def validation_report_path(datadir: Path, scan_type, report, extension):
+    """
+    Location of a validation report of a scan
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - report (string): Name of the report, "accuracy" or "mismatches"
+    - extension (string): File extension
+
+    Returns:
+    - (Path): Report file path
+    """
+
+    return (
+        Path(datadir) / "final_report" / f"{scan_type}_validation_{report}.{extension}"
+    )
+
+
+def write_accuracy_report(accuracies, mismatches, datadir: Path, scan_type):
+    """
+    Writes the accuracy of every compared column as JSON
+
+    Parameters:
+    - accuracies (Series): Accuracy in % of each GBD column, see compare_columns
+    - mismatches (dataframe): Mismatch mask of each GBD column, see compare_columns
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    """
+
+    report = {
+        "scan_type": scan_type,
+        "rows": len(mismatches),
+        "columns": {
+            column: {
+                "accuracy": float(accuracies[column]),
+                "mismatches": int(mismatches[column].sum()),
+            }
+            for column in mismatches.columns
+        },
+    }
+
+    with open(validation_report_path(datadir, scan_type, "accuracy", "json"), "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def iter_mismatch_chunks(
+    merged_df, mismatches, gbd_keys, gbd_cols, auto_cols, schema, chunk_size
+):
+    """
+    Yields the mismatched values of every compared column, a chunk of rows at a time
+
+    Parameters:
+    - merged_df (dataframe): Output of merge_on_keys
+    - mismatches (dataframe): Mismatch mask of each GBD column, see compare_columns
+    - gbd_keys (list): List of keys in GBD result identifying the rows
+    - gbd_cols (list): Compared columns from the GBD dataframe
+    - auto_cols (list): Compared columns from the Automated dataframe, in the same order
+    - schema (Schema): Arrow schema of the chunks
+    - chunk_size (int): Maximum number of rows of a chunk
+
+    Returns:
+    - (Table): Keys, column name, auto value and GBD value of the mismatched rows
+    """
+
+    for gbd_col, auto_col in zip(gbd_cols, auto_cols):
+        rows = np.flatnonzero(mismatches[gbd_col].to_numpy())
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = merged_df.iloc[rows[start : start + chunk_size]]
+            yield pa.Table.from_pandas(
+                pd.DataFrame(
+                    {
+                        **{key: chunk[key + "_gbd"] for key in gbd_keys},
+                        "column": gbd_col,
+                        "auto_value": chunk[auto_col + "_auto"],
+                        "gbd_value": chunk[gbd_col + "_gbd"],
+                    }
+                ),
+                schema=schema,
+                preserve_index=False,
+            )
+
+
+@profiled
+def write_mismatch_report(
+    merged_df,
+    mismatches,
+    gbd_keys,
+    gbd_cols,
+    auto_cols,
+    datadir: Path,
+    scan_type,
+    export_csv=False,
+):
+    """
+    Streams the mismatched values of every compared column to a Parquet file, one row per mismatched value
+
+    Parameters:
+    - merged_df (dataframe): Output of merge_on_keys
+    - mismatches (dataframe): Mismatch mask of each GBD column, see compare_columns
+    - gbd_keys (list): List of keys in GBD result identifying the rows
+    - gbd_cols (list): Compared columns from the GBD dataframe
+    - auto_cols (list): Compared columns from the Automated dataframe, in the same order
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - export_csv (bool): Also write the mismatches as CSV
+    """
+
+    gbd_keys = list(dict.fromkeys(gbd_keys))
+    schema = pa.schema(
+        [(key, pa.string()) for key in gbd_keys]
+        + [
+            ("column", pa.string()),
+            ("auto_value", pa.string()),
+            ("gbd_value", pa.string()),
+        ]
+    )
+
+    writers = [
+        pq.ParquetWriter(
+            validation_report_path(datadir, scan_type, "mismatches", "parquet"), schema
+        )
+    ]
+    if export_csv:
+        writers.append(
+            pa_csv.CSVWriter(
+                validation_report_path(datadir, scan_type, "mismatches", "csv"), schema
+            )
+        )
+
+    try:
+        for chunk in iter_mismatch_chunks(
+            merged_df,
+            mismatches,
+            gbd_keys,
+            gbd_cols,
+            auto_cols,
+            schema,
+            MISMATCH_CHUNK_SIZE,
+        ):
+            for writer in writers:
+                writer.write_table(chunk)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+@profiled
+def validate_columns(
+    gbd_keys,
+    auto_keys,
+    gbd_cols,
+    auto_cols,
+    gbd,
+    auto,
+    datadir: Path,
+    scan_type,
+    export_csv=False,
+):
+    """
+    Compares the GBD and Automatically generated dataframes, prints out the accuracy of every compared column
+    and writes the accuracy and mismatch reports in the final report folder
+
+    Parameters:
+    - gbd_keys (list): List of keys in GBD result that will be used for matching the rows
+    - auto_keys (list): List of keys in Automated result that will be used for matching the rows
+    - gbd_cols (list): Columns from the GBD dataframe that you want to compare with Automated dataset
+    - auto_cols (list): Columns from the Automated dataframe that you want to compare with GBD dataset
+    - gbd (dataframe): GBD generated dataframe
+    - auto (dataframe): Automatically generated dataframe
+    - datadir (Path): Folder location of the datasets
+    - scan_type (string): Type of scan
+    - export_csv (bool): Also write the mismatches as CSV
+
+    Returns:
+    - (Series): Accuracy in % of each GBD column
+    """
+
+    merged_df = merge_on_keys(gbd_keys, auto_keys, gbd_cols, auto_cols, gbd, auto)
+    mismatches, accuracies = compare_columns(merged_df, gbd_cols, auto_cols)
+
+    for gbd_col in gbd_cols:
+        print("For ", gbd_col, "accuracy in % is ", accuracies[gbd_col])
+
+    write_accuracy_report(accuracies, mismatches, datadir, scan_type)
+    write_mismatch_report(
+        merged_df,
+        mismatches,
+        gbd_keys,
+        gbd_cols,
+        auto_cols,
+        datadir,
+        scan_type,
+        export_csv,
+    )
+    print(
+        "Mismatched values written to",
+        validation_report_path(datadir, scan_type, "mismatches", "parquet"),
+    )
+
+    return accuracies
@@ -0,0 +1,250 @@
+from pathlib import Path
+import functools
+import json
+import os
+import time
+import tracemalloc
+import pandas as pd
+
+# Profiling state of the current process: the records of the finished stages and the stages still running
+PROFILE = {"enabled": False, "records": [], "stack": [], "count": 0}
+
+
+def enable_profiling():
+    """
+    Starts recording the profiled stages of the current process, see profiled
+    """
+
+    PROFILE["enabled"] = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def frame_shape(value):
+    """
+    Shape of the first dataframe or Series of a stage argument or result
+
+    Parameters:
+    - value: Stage result, or tuple of arguments or results
+
+    Returns:
+    - (int), (int): Number of rows and columns, None if there is no dataframe or Series
+    """
+
+    for item in value if isinstance(value, (tuple, list)) else (value,):
+        if isinstance(item, pd.DataFrame):
+            return item.shape
+        if isinstance(item, pd.Series):
+            return len(item), 1
+
+    return None, None
+
+
+def run_profiled_stage(func, args, kwargs):
+    """
+    Runs a stage and records its wall and CPU time, rows in and out, column count and peak allocated memory.
+    The peak memory of a stage covers the stages it calls, their own peak is carried over to it.
+
+    Parameters:
+    - func (function): Stage function
+    - args (tuple): Positional arguments of the stage
+    - kwargs (dict): Keyword arguments of the stage
+
+    Returns:
+    - Result of the stage
+    """
+
+    stack = PROFILE["stack"]
+    if stack:
+        stack[-1]["carried"] = max(
+            stack[-1]["carried"], tracemalloc.get_traced_memory()[1]
+        )
+    tracemalloc.reset_peak()
+    PROFILE["count"] += 1
+    frame = {
+        "id": f"{os.getpid()}-{PROFILE['count']}",
+        "parent": stack[-1]["id"] if stack else None,
+        "start_memory": tracemalloc.get_traced_memory()[0],
+        "carried": 0,
+    }
+    stack.append(frame)
+
+    started = time.time()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        peak = max(tracemalloc.get_traced_memory()[1], frame["carried"])
+        stack.pop()
+        if stack:
+            stack[-1]["carried"] = max(stack[-1]["carried"], peak)
+            tracemalloc.reset_peak()
+
+    rows_in = frame_shape(args)[0]
+    rows_out, columns = frame_shape(result)
+    PROFILE["records"].append(
+        {
+            "stage": f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}",
+            "id": frame["id"],
+            "parent": frame["parent"],
+            "pid": os.getpid(),
+            "started": started,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "columns": columns,
+            "peak_mib": (peak - frame["start_memory"]) / 2**20,
+        }
+    )
+
+    return result
+
+
+def profiled(func):
+    """
+    Decorator recording a pipeline stage when running with --profile, the stage is called as is otherwise
+
+    Parameters:
+    - func (function): Stage function
+
+    Returns:
+    - (function): Profiled stage function
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILE["enabled"]:
+            return func(*args, **kwargs)
+        return run_profiled_stage(func, args, kwargs)
+
+    return wrapper
+
+
+def run_in_worker(profile, func, *args):
+    """
+    Runs a stage in a worker process of the pipeline, see pipeline.run_scans
+
+    Parameters:
+    - profile (bool): Record the profiled stages of the worker
+    - func (function): Stage function
+    - args: Arguments of the stage
+
+    Returns:
+    - Result of the stage, (list): Records of the profiled stages run by the worker
+    """
+
+    if profile:
+        enable_profiling()
+    # Workers may be forked from a process that already has records
+    PROFILE["records"].clear()
+    PROFILE["stack"].clear()
+
+    result = func(*args)
+    records = list(PROFILE["records"])
+    PROFILE["records"].clear()
+
+    return result, records
+
+
+def worker_result(future):
+    """
+    Result of a stage run with run_in_worker, keeping the records of the worker with the ones of this process.
+    The stages of the worker are recorded as called by the stage of this process waiting for them.
+
+    Parameters:
+    - future (Future): Stage submitted to the process pool
+
+    Returns:
+    - Result of the stage
+    """
+
+    result, records = future.result()
+    if PROFILE["stack"]:
+        for record in records:
+            if record["parent"] is None:
+                record["parent"] = PROFILE["stack"][-1]["id"]
+    PROFILE["records"].extend(records)
+
+    return result
+
+
+def ordered_records(records):
+    """
+    Orders the profiled stages as a call tree, every stage being followed by the stages it called
+
+    Parameters:
+    - records (list): Records of the profiled stages
+
+    Returns:
+    - (list): Depth in the call tree and record of every stage, in start order within each caller
+    """
+
+    called = {}
+    for record in sorted(records, key=lambda record: record["started"]):
+        called.setdefault(record["parent"], []).append(record)
+
+    ordered = []
+    pending = [(0, record) for record in reversed(called.get(None, []))]
+    while pending:
+        depth, record = pending.pop()
+        ordered.append((depth, record))
+        pending.extend(
+            (depth + 1, child) for child in reversed(called.get(record["id"], []))
+        )
+
+    return ordered
+
+
+def profile_table(records):
+    """
+    Formats the profiled stages as a table, the stages called by another stage are indented below it
+
+    Parameters:
+    - records (list): Records of the profiled stages
+
+    Returns:
+    - (string): Table with one line per stage
+    """
+
+    ordered = ordered_records(records)
+    table = pd.DataFrame([record for depth, record in ordered])
+    table["stage"] = ["  " * depth + record["stage"] for depth, record in ordered]
+    table = table.drop(columns=["id", "parent", "started"])
+
+    return table.to_string(
+        index=False,
+        justify="left",
+        formatters={
+            "stage": lambda stage: stage.ljust(table["stage"].str.len().max()),
+            "wall_seconds": "{:.3f}".format,
+            "cpu_seconds": "{:.3f}".format,
+            "peak_mib": "{:.1f}".format,
+        },
+        na_rep="-",
+        float_format="{:.0f}".format,
+    )
+
+
+def write_profile(datadir: Path):
+    """
+    Writes the records of the profiled stages next to the final report, as JSON and as a table
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    """
+
+    records = PROFILE["records"]
+    if not records:
+        return
+
+    report_path = Path(datadir) / "final_report"
+    with open(report_path / "profile.json", "w") as f:
+        json.dump({"stages": records}, f, indent=4)
+
+    with open(report_path / "profile.txt", "w") as f:
+        f.write(profile_table(records) + "\n")
+
+    print(f"Profile written to {report_path / 'profile.txt'}")
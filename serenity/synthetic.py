@@ -0,0 +1,407 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import json
+import random
+
+# Operating systems reported by vCenter, the Red Hat ones are picked with the rhel_ratio
+VCENTER_RED_HAT_OS = [
+    "Red Hat Enterprise Linux 9 (64-bit)",
+    "Red Hat Enterprise Linux 8 (64-bit)",
+    "Red Hat Enterprise Linux 7 (64-bit)",
+]
+VCENTER_OTHER_OS = [
+    "Microsoft Windows Server 2019 (64-bit)",
+    "Microsoft Windows XP Professional (32-bit)",
+    "Other 3.x or later Linux (64-bit)",
+    "CentOS 7 (64-bit)",
+    "Ubuntu Linux (64-bit)",
+]
+
+# Operating systems reported by Satellite, None leaves the fact out
+SATELLITE_RED_HAT_OS = ["RHEL", "RedHat", "RedHat_Workstation"]
+SATELLITE_OTHER_OS = ["Windows", "CentOS", None]
+
+# Name markers of the test, clone, new servers, see v_center.similar_name_root
+VARIANT_SUFFIXES = ["_test", "_clone", "_new", "test", "clone"]
+
+# Error message of the Network facts that could not be collected
+ERROR_FACT = "Could not run command"
+
+# Dates of the synthetic servers are spread over the days following this one
+FIRST_DATE = datetime(2020, 1, 1)
+DATE_RANGE_DAYS = 1500
+
+# Raw facts of the Network dates, see network.add_date_column
+NETWORK_DATE_FACTS = ["date_anaconda_log", "date_yum_history", "date_filesystem_create"]
+
+
+def random_date(rng):
+    """
+    Picks a random date and time of a synthetic server
+
+    Parameters:
+    - rng (Random): Random generator
+
+    Returns:
+    - (datetime): Date and time within DATE_RANGE_DAYS of FIRST_DATE
+    """
+
+    return FIRST_DATE + timedelta(
+        days=rng.randrange(DATE_RANGE_DAYS), seconds=rng.randrange(86400)
+    )
+
+
+def vcenter_names(hosts, rng, duplicate_ratio, variant_ratio, template_ratio):
+    """
+    Picks the VM names of the synthetic vCenter scan.
+    A share of the VMs reuses the name of a previous VM (duplicates) or adds a test, clone, new marker to it (variants).
+
+    Parameters:
+    - hosts (int): Number of VMs
+    - rng (Random): Random generator
+    - duplicate_ratio (float): Share of VMs named after a previous VM
+    - variant_ratio (float): Share of VMs named after a previous VM with a variant marker
+    - template_ratio (float): Share of template VMs
+
+    Returns:
+    - (list): Name of every VM
+    """
+
+    names = []
+    for i in range(hosts):
+        draw = rng.random()
+        if names and draw < duplicate_ratio:
+            names.append(rng.choice(names))
+        elif names and draw < duplicate_ratio + variant_ratio:
+            names.append(rng.choice(names) + rng.choice(VARIANT_SUFFIXES))
+        elif draw < duplicate_ratio + variant_ratio + template_ratio:
+            names.append(f"template{i:07d}")
+        else:
+            names.append(f"host{i:07d}")
+
+    return names
+
+
+def vcenter_facts(
+    hosts,
+    rng,
+    duplicate_ratio,
+    variant_ratio,
+    template_ratio,
+    rhel_ratio,
+    powered_off_ratio,
+):
+    """
+    Builds the raw facts of the synthetic vCenter scan
+
+    Parameters:
+    - hosts (int): Number of VMs
+    - rng (Random): Random generator
+    - duplicate_ratio (float): Share of VMs named after a previous VM, with a different DNS domain
+    - variant_ratio (float): Share of VMs named after a previous VM with a variant marker
+    - template_ratio (float): Share of template VMs
+    - rhel_ratio (float): Share of Red Hat VMs
+    - powered_off_ratio (float): Share of powered off VMs
+
+    Returns:
+    - generator: Facts dictionary of each VM
+    """
+
+    names = vcenter_names(hosts, rng, duplicate_ratio, variant_ratio, template_ratio)
+    for i, name in enumerate(names):
+        host = i % max(hosts // 20, 1)
+        yield {
+            "vm.name": name,
+            "vm.os": rng.choice(
+                VCENTER_RED_HAT_OS if rng.random() < rhel_ratio else VCENTER_OTHER_OS
+            ),
+            "vm.state": (
+                "poweredOff" if rng.random() < powered_off_ratio else "poweredOn"
+            ),
+            "vm.dns_name": f"{name}.domain{i % 7}.example.com",
+            "vm.uuid": f"vm-{i:08x}",
+            "vm.cluster": f"cluster{host % 10}",
+            "vm.cpu_count": rng.choice([2, 4, 8]),
+            "vm.memory_size": rng.choice([4, 8, 16]),
+            "vm.ip_addresses": [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"],
+            "vm.host.name": f"esx{host}.example.com",
+            "vm.host.uuid": f"esx-{host:06x}",
+            "vm.host.socket_count": rng.choice([1, 2, 4]),
+            "vm.host.cpu_count": rng.choice([16, 32]),
+        }
+
+
+def network_facts(hosts, vcenter_hosts, rng, overlap_ratio, error_ratio):
+    """
+    Builds the raw facts and system fingerprints of the synthetic Network scan
+
+    Parameters:
+    - hosts (int): Number of servers
+    - vcenter_hosts (int): Number of VMs of the vCenter scan
+    - rng (Random): Random generator
+    - overlap_ratio (float): Share of servers that are also VMs of the vCenter scan
+    - error_ratio (float): Share of servers with facts that could not be collected
+
+    Returns:
+    - generator: Facts dictionary and system fingerprint of each server
+    """
+
+    for i in range(hosts):
+        if vcenter_hosts and rng.random() < overlap_ratio:
+            name = f"host{i % vcenter_hosts:07d}"
+        else:
+            name = f"net{i:07d}"
+
+        dates = {
+            date_fact: random_date(rng)
+            for date_fact in NETWORK_DATE_FACTS
+            if date_fact == "date_anaconda_log" or rng.random() < 0.5
+        }
+        sockets = rng.choice([1, 2, 4, None])
+        fact = {
+            "uname_hostname": f"{name}.example.com",
+            "connection_uuid": f"conn-{i:08x}",
+            "etc_machine_id": f"machine-{i:08x}",
+            "dmi_system_uuid": f"dmi-{i:08x}",
+            "etc_release_name": "Red Hat Enterprise Linux",
+            "etc_release_version": rng.choice(["7.9", "8.6", "9.2"]),
+            "virt_virt": rng.choice(["virt-guest", "bare metal"]),
+            "cpu_core_count": rng.choice([2, 4, 8]),
+            "redhat_packages_gpg_num_rh_packages": rng.randrange(12),
+            **{
+                date_fact: value.strftime("%Y-%m-%d %H:%M:%S")
+                for date_fact, value in dates.items()
+            },
+        }
+        if sockets is not None:
+            fact["cpu_socket_count"] = sockets
+        if rng.random() < error_ratio:
+            fact["uname_processor"] = ERROR_FACT
+
+        yield fact, {
+            "name": name,
+            "system_creation_date": min(dates.values()).strftime("%Y-%m-%d"),
+        }
+
+
+def satellite_facts(
+    hosts,
+    vcenter_hosts,
+    rng,
+    overlap_ratio,
+    rhel_ratio,
+    hypervisor_ratio,
+    missing_ratio,
+):
+    """
+    Builds the raw facts of the synthetic Satellite scan
+
+    Parameters:
+    - hosts (int): Number of servers
+    - vcenter_hosts (int): Number of VMs of the vCenter scan
+    - rng (Random): Random generator
+    - overlap_ratio (float): Share of servers that are also VMs of the vCenter scan
+    - rhel_ratio (float): Share of Red Hat servers
+    - hypervisor_ratio (float): Share of virt-who hypervisors
+    - missing_ratio (float): Share of servers missing their uuid and os name
+
+    Returns:
+    - generator: Facts dictionary of each server
+    """
+
+    for i in range(hosts):
+        draw = rng.random()
+        if vcenter_hosts and draw < overlap_ratio:
+            name = f"host{i % vcenter_hosts:07d}"
+        elif draw < overlap_ratio + hypervisor_ratio:
+            name = f"virt-who-{i:07d}"
+        else:
+            name = f"sat{i:07d}"
+
+        fact = {
+            "hostname": f"{name}.example.com",
+            "uuid": f"sat-{i:08x}",
+            "os_name": rng.choice(
+                SATELLITE_RED_HAT_OS
+                if rng.random() < rhel_ratio
+                else SATELLITE_OTHER_OS
+            ),
+            "os_version": rng.choice(["7", "8", "9"]),
+            "virt_type": rng.choice(["Not Applicable", "vmware", "kvm", None]),
+            "is_virtualized": rng.choice(["Unknown", "true", "false", None]),
+            "num_sockets": rng.choice(["1", "2", "4", None]),
+            "cores": rng.choice([2, 4, 8]),
+            "virtual_host_name": f"hypervisor{i % 50}.example.com",
+            "registration_time": random_date(rng).strftime("%Y-%m-%d %H:%M:%S UTC"),
+        }
+        if rng.random() < missing_ratio:
+            fact["uuid"] = fact["os_name"] = None
+
+        yield {key: value for key, value in fact.items() if value is not None}
+
+
+def write_details(file_path: Path, report_id, source_type, facts):
+    """
+    Writes a details.json report, streaming the facts so the whole report is never held in memory
+
+    Parameters:
+    - file_path (Path): Location of the report
+    - report_id (int): Report id
+    - source_type (string): Type of scan
+    - facts (iterable): Facts dictionary of each server
+    """
+
+    with open(file_path, "w") as f:
+        f.write(
+            f'{{"report_id": {report_id}, "report_type": "details", "sources": '
+            f'[{{"source_name": "synthetic-{source_type}", "source_type": "{source_type}", "facts": ['
+        )
+        for i, fact in enumerate(facts):
+            if i:
+                f.write(", ")
+            f.write(json.dumps(fact))
+        f.write("]}]}")
+
+
+def write_deployments(file_path: Path, report_id, fingerprints):
+    """
+    Writes a deployments.json report, streaming the fingerprints as write_details does
+
+    Parameters:
+    - file_path (Path): Location of the report
+    - report_id (int): Report id
+    - fingerprints (iterable): System fingerprint of each server
+    """
+
+    with open(file_path, "w") as f:
+        f.write(f'{{"report_id": {report_id}, "system_fingerprints": [')
+        for i, fingerprint in enumerate(fingerprints):
+            if i:
+                f.write(", ")
+            f.write(json.dumps(fingerprint))
+        f.write("]}")
+
+
+def write_recon(
+    datadir: Path,
+    hosts=1000,
+    seed=0,
+    duplicate_ratio=0.05,
+    variant_ratio=0.02,
+    template_ratio=0.01,
+    rhel_ratio=0.6,
+    powered_off_ratio=0.2,
+    overlap_ratio=0.1,
+    error_ratio=0.01,
+    hypervisor_ratio=0.02,
+    missing_ratio=0.01,
+):
+    """
+    Writes a deterministic synthetic recon folder with the raw vCenter, Network and Satellite reports,
+    and the empty intermediate and final report folders
+
+    Parameters:
+    - datadir (Path): Folder location of the datasets
+    - hosts (int): Number of servers of every scan
+    - seed (int): Seed of the random generator, the same seed always gives the same reports
+    - duplicate_ratio (float): Share of VMs named after a previous VM
+    - variant_ratio (float): Share of VMs named after a previous VM with a test, clone, new marker
+    - template_ratio (float): Share of template VMs
+    - rhel_ratio (float): Share of Red Hat servers
+    - powered_off_ratio (float): Share of powered off VMs
+    - overlap_ratio (float): Share of Network and Satellite servers that are also VMs of the vCenter scan
+    - error_ratio (float): Share of Network servers with facts that could not be collected
+    - hypervisor_ratio (float): Share of virt-who hypervisors in Satellite
+    - missing_ratio (float): Share of Satellite servers missing their uuid and os name
+    """
+
+    datadir = Path(datadir)
+    rng = random.Random(seed)
+    for folder in ["raw", "intermediate"]:
+        for scan_type in ["vcenter", "network", "satellite"]:
+            (datadir / folder / scan_type).mkdir(parents=True, exist_ok=True)
+    (datadir / "final_report").mkdir(parents=True, exist_ok=True)
+
+    raw = datadir / "raw"
+    write_details(
+        raw / "vcenter" / "details.json",
+        1,
+        "vcenter",
+        vcenter_facts(
+            hosts,
+            rng,
+            duplicate_ratio,
+            variant_ratio,
+            template_ratio,
+            rhel_ratio,
+            powered_off_ratio,
+        ),
+    )
+    write_deployments(raw / "vcenter" / "deployments.json", 1, [])
+
+    # The facts and fingerprints come from the same draws, the servers are generated again from the same
+    # state of the random generator to stream the fingerprints
+    state = rng.getstate()
+    write_details(
+        raw / "network" / "details.json",
+        2,
+        "network",
+        (
+            fact
+            for fact, _ in network_facts(hosts, hosts, rng, overlap_ratio, error_ratio)
+        ),
+    )
+    rng.setstate(state)
+    write_deployments(
+        raw / "network" / "deployments.json",
+        2,
+        (
+            fingerprint
+            for _, fingerprint in network_facts(
+                hosts, hosts, rng, overlap_ratio, error_ratio
+            )
+        ),
+    )
+
+    write_details(
+        raw / "satellite" / "details.json",
+        3,
+        "satellite",
+        satellite_facts(
+            hosts,
+            hosts,
+            rng,
+            overlap_ratio,
+            rhel_ratio,
+            hypervisor_ratio,
+            missing_ratio,
+        ),
+    )
+    write_deployments(raw / "satellite" / "deployments.json", 3, [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic recon folder with raw vCenter, Network and Satellite reports"
+    )
+    parser.add_argument(
+        "--foldername", required=True, help="Name of the recon folder in data/"
+    )
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--variant-ratio", type=float, default=0.02)
+    parser.add_argument("--powered-off-ratio", type=float, default=0.2)
+    parser.add_argument("--error-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+
+    write_recon(
+        Path("data") / args.foldername,
+        hosts=args.hosts,
+        seed=args.seed,
+        duplicate_ratio=args.duplicate_ratio,
+        variant_ratio=args.variant_ratio,
+        powered_off_ratio=args.powered_off_ratio,
+        error_ratio=args.error_ratio,
+    )
@@ -0,0 +1,66 @@
+import pandas as pd
+from serenity.process_scans.create_deployment_details import (
+    combine_deployments,
+    deployment_from_scan,
+)
+from serenity.process_scans.identity import identity_keys
+
+
+def vcenter_scan(names, states, considered):
+    """
+    Rendered vCenter intermediate data of VMs sharing their DNS name, as classified by the vCenter rules
+    """
+
+    return pd.DataFrame(
+        {
+            "vm.name": names,
+            "vm.state": states,
+            "vm.dns_name": "app.example.com",
+            "vm.dns_name_trimmed": "app",
+            "vm.uuid": [f"uuid-{number}" for number in range(len(names))],
+            "Considered": considered,
+        }
+    )
+
+
+def combine(scans):
+    deployment_frames = [deployment_from_scan(data, scan) for scan, data in scans]
+    key_frames = [identity_keys(data, scan) for scan, data in scans]
+
+    return combine_deployments(deployment_frames, key_frames)
+
+
+def test_mixed_power_state_cluster_keeps_the_powered_on_vm():
+    scan_data = vcenter_scan(
+        ["app-old", "app"], ["poweredOff", "poweredOn"], ["N", "Y"]
+    )
+
+    report = combine([("vcenter", scan_data)])
+
+    assert report["Cluster_ID"].nunique() == 1
+    assert list(report["Considered?(Y/N)"]) == ["N", "Y"]
+    assert list(report["Duplicate?(Y/N)"]) == ["Y", "Y"]
+
+
+def test_all_powered_on_cluster_keeps_every_vm():
+    scan_data = vcenter_scan(
+        ["app", "app-clone"], ["poweredOn", "poweredOn"], ["Y", "Y"]
+    )
+
+    report = combine([("vcenter", scan_data)])
+
+    assert list(report["Considered?(Y/N)"]) == ["Y", "Y"]
+
+
+def test_cluster_is_counted_on_the_source_considering_it():
+    vcenter_data = vcenter_scan(
+        ["app-old", "app"], ["poweredOff", "poweredOn"], ["N", "Y"]
+    )
+    network_data = pd.DataFrame(
+        {"uname_hostname": ["app"], "Considered ?": [""], "Comment": [""]}
+    )
+
+    report = combine([("network", network_data), ("vcenter", vcenter_data)])
+
+    assert list(report["Source"]) == ["Network", "vcenter", "vcenter"]
+    assert list(report["Considered?(Y/N)"]) == ["N", "N", "Y"]